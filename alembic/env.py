@@ -21,8 +21,9 @@ if config.config_file_name is not None:
 # target_metadata = mymodel.Base.metadata
 target_metadata = Base.metadata
 
-# set the sqlalchemy.url in the config object
-config.set_main_option("sqlalchemy.url", DATABASE_URL)
+# set the sqlalchemy.url in the config object; "%" is escaped for configparser,
+# as URL-encoded passwords may contain it
+config.set_main_option("sqlalchemy.url", DATABASE_URL.replace("%", "%%"))
 
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
@@ -0,0 +1,37 @@
+"""add pool index to map
+
+Revision ID: 3f9a0c2e6b51
+Revises: b7e3c1d94a20
+Create Date: 2026-10-17 10:41:07.552913
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "3f9a0c2e6b51"
+down_revision: str | Sequence[str] | None = "b7e3c1d94a20"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    is_pregenerated = sa.column("is_pregenerated").is_(True)
+    op.create_index(
+        "ix_maps_pool",
+        "maps",
+        ["size", "octaves", "island_density"],
+        unique=False,
+        sqlite_where=is_pregenerated,
+        postgresql_where=is_pregenerated,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_maps_pool", table_name="maps")
@@ -0,0 +1,35 @@
+"""allow tiled maps without blob
+
+Revision ID: 8c4d2e7f1a93
+Revises: 3f9a0c2e6b51
+Create Date: 2026-10-17 13:26:51.904117
+
+"""
+
+from collections.abc import Sequence
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "8c4d2e7f1a93"
+down_revision: str | Sequence[str] | None = "3f9a0c2e6b51"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table("maps") as batch_op:
+        batch_op.alter_column("blob_key", nullable=True)
+        batch_op.alter_column("byte_size", nullable=True)
+        batch_op.alter_column("content_hash", nullable=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Tiled maps have no image to keep, so they cannot survive the downgrade.
+    op.execute("DELETE FROM maps WHERE blob_key IS NULL")
+    with op.batch_alter_table("maps") as batch_op:
+        batch_op.alter_column("content_hash", nullable=False)
+        batch_op.alter_column("byte_size", nullable=False)
+        batch_op.alter_column("blob_key", nullable=False)
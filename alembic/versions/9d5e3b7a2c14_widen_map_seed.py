@@ -0,0 +1,41 @@
+"""widen map seed to 64 bits
+
+Revision ID: 9d5e3b7a2c14
+Revises: 6a1f9d3b8e25
+Create Date: 2026-10-17 18:40:12.482019
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "9d5e3b7a2c14"
+down_revision: str | Sequence[str] | None = "6a1f9d3b8e25"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table("maps") as batch_op:
+        batch_op.alter_column(
+            "seed",
+            existing_type=sa.Integer(),
+            type_=sa.BigInteger(),
+            existing_nullable=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table("maps") as batch_op:
+        batch_op.alter_column(
+            "seed",
+            existing_type=sa.BigInteger(),
+            type_=sa.Integer(),
+            existing_nullable=True,
+        )
@@ -0,0 +1,74 @@
+"""move map data to blob store
+
+Revision ID: b7e3c1d94a20
+Revises: 5d2ff5620f7a
+Create Date: 2026-10-17 09:12:44.318205
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+
+from alembic import op
+from magrathea.maps.blob_store import blob_store
+
+# revision identifiers, used by Alembic.
+revision: str = "b7e3c1d94a20"
+down_revision: str | Sequence[str] | None = "5d2ff5620f7a"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("maps", sa.Column("blob_key", sa.String(), nullable=True))
+    op.add_column("maps", sa.Column("byte_size", sa.Integer(), nullable=True))
+    op.add_column("maps", sa.Column("content_hash", sa.String(), nullable=True))
+
+    # Copy each image into the blob store, one row at a time so the whole
+    # table is never held in memory.
+    conn = op.get_bind()
+    map_ids = conn.execute(sa.text("SELECT id FROM maps")).scalars().all()
+    for map_id in map_ids:
+        data = conn.execute(
+            sa.text("SELECT data FROM maps WHERE id = :id"), {"id": map_id}
+        ).scalar_one()
+        blob = blob_store.put(data)
+        conn.execute(
+            sa.text(
+                "UPDATE maps SET blob_key = :key, byte_size = :size, "
+                "content_hash = :hash WHERE id = :id"
+            ),
+            {
+                "key": blob.key,
+                "size": blob.byte_size,
+                "hash": blob.content_hash,
+                "id": map_id,
+            },
+        )
+
+    with op.batch_alter_table("maps") as batch_op:
+        batch_op.alter_column("blob_key", nullable=False)
+        batch_op.alter_column("byte_size", nullable=False)
+        batch_op.alter_column("content_hash", nullable=False)
+        batch_op.drop_column("data")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.add_column("maps", sa.Column("data", sa.LargeBinary(), nullable=True))
+
+    conn = op.get_bind()
+    rows = conn.execute(sa.text("SELECT id, blob_key FROM maps")).all()
+    for map_id, blob_key in rows:
+        conn.execute(
+            sa.text("UPDATE maps SET data = :data WHERE id = :id"),
+            {"data": blob_store.get(blob_key), "id": map_id},
+        )
+
+    with op.batch_alter_table("maps") as batch_op:
+        batch_op.alter_column("data", nullable=False)
+        batch_op.drop_column("content_hash")
+        batch_op.drop_column("byte_size")
+        batch_op.drop_column("blob_key")
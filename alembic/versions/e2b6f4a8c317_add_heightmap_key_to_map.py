@@ -0,0 +1,30 @@
+"""add heightmap key to map
+
+Revision ID: e2b6f4a8c317
+Revises: 8c4d2e7f1a93
+Create Date: 2026-10-17 15:08:12.603581
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "e2b6f4a8c317"
+down_revision: str | Sequence[str] | None = "8c4d2e7f1a93"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("maps", sa.Column("heightmap_key", sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table("maps") as batch_op:
+        batch_op.drop_column("heightmap_key")
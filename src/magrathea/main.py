@@ -1,13 +1,56 @@
 import os
+from collections.abc import AsyncGenerator
+from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 from fastapi.responses import FileResponse
 from fastapi.staticfiles import StaticFiles
 
 from magrathea.maps.api import map_router
+from magrathea.maps.job_queue import WorkerThreads, job_queue
+from magrathea.maps.rendering_engine import warm_up
+from magrathea.maps.replenisher import (
+    POOL_BUCKETS,
+    POOL_REPLENISH,
+    PoolReplenisher,
+    parse_buckets,
+)
+from magrathea.metrics import SERVER_TIMING, ServerTimingMiddleware
+from magrathea.profiling import PROFILE_SAMPLE_RATE, ProfilingMiddleware, admin_router
+from magrathea.redis_store import store
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncGenerator[None]:
+    # Load the noise kernels before any request, or any background render,
+    # can call them. Run on the main thread: Numba's TBB threading layer hangs
+    # at exit when it was first started from another thread.
+    warm_up()
+    replenisher = (
+        PoolReplenisher(parse_buckets(POOL_BUCKETS)) if POOL_REPLENISH else None
+    )
+    if replenisher is not None:
+        replenisher.start()
+    # With Redis configured, queued jobs are rendered by `render-worker` processes.
+    workers = WorkerThreads(job_queue) if store is None else None
+    if workers is not None:
+        workers.start()
+    try:
+        yield
+    finally:
+        if workers is not None:
+            workers.stop()
+        if replenisher is not None:
+            replenisher.stop()
+
+
+app = FastAPI(lifespan=lifespan)
 app.include_router(map_router)
+app.include_router(admin_router)
+if SERVER_TIMING:
+    app.add_middleware(ServerTimingMiddleware)
+if PROFILE_SAMPLE_RATE > 0:
+    app.add_middleware(ProfilingMiddleware)
 
 static_path = os.path.join(os.path.dirname(__file__), "static")
 if os.path.exists(static_path):
@@ -1,44 +1,234 @@
-from fastapi import APIRouter, Request, Response
+import asyncio
+import os
+import random
+import uuid
+from collections.abc import AsyncIterator, Iterator
+from typing import Annotated, Literal, NamedTuple
 
-# from fastapi.templating import TemplateResponse
-from pydantic import BaseModel
+import numpy as np
+import numpy.typing as npt
+from fastapi import (
+    APIRouter,
+    Depends,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+)
+from fastapi.responses import FileResponse, StreamingResponse
+from loguru import logger
+from pydantic import BaseModel, ConfigDict, Field
+from sqlalchemy.orm import Session
 
+from magrathea.database import get_db
+from magrathea.maps.blob_store import (
+    BlobStore,
+    encode_array,
+    get_blob_store,
+    load_array,
+)
+from magrathea.maps.encoders import (
+    DEFAULT_FORMAT,
+    ENCODERS,
+    MAX_COMPRESSION_LEVEL,
+    OutputFormat,
+    encode,
+    negotiate_format,
+)
+from magrathea.maps.http_cache import (
+    NO_STORE,
+    Conditions,
+    cacheable_response,
+    etag_matches,
+    get_conditions,
+    not_modified,
+    strong_etag,
+    validator_headers,
+)
+from magrathea.maps.job_queue import (
+    JobQueue,
+    JobStatus,
+    MapJob,
+    QueueFullError,
+    get_job_queue,
+)
+from magrathea.maps.layers import LAYER_MAX_SIZE, layered_heightmap
+from magrathea.maps.map import Map, store_levels
+from magrathea.maps.pool import claim_pregenerated_map
+from magrathea.maps.render_cache import (
+    cache_key,
+    render_cache,
+    render_map_images_cached,
+    render_tile_cached,
+    tile_cache_key,
+)
+from magrathea.maps.rendering_engine import (
+    HEIGHTMAP_DTYPE,
+    PNG_COMPRESSION_LEVEL,
+    STREAM_BAND_ROWS,
+    downsample,
+    encode_map_images,
+    generate_heightmap,
+    iter_heightmap_png,
+    iter_map_images,
+    iter_map_png,
+    max_zoom,
+    mip_size,
+)
+from magrathea.maps.replenisher import POOL_BUCKETS, parse_buckets, pool_level
+from magrathea.maps.world_map import WorldMap
+from magrathea.metrics import (
+    METRICS_CONTENT_TYPE,
+    cache_lookups,
+    gauge,
+    render_metrics,
+    stage_seconds,
+    timed,
+)
 from magrathea.templates import templates
 
-# from magrathea.database import get_db
-# from magrathea.maps.map import Map
-# from magrathea.maps.rendering_engine import render_map_to_buffer
-
 map_router = APIRouter()
 
+# Most maps a single batch request may create.
+MAX_BATCH_MAPS = 256
+# Largest map rendered within a request; bigger ones go through POST /jobs, so
+# a single huge render can't hold a request thread for everyone else.
+MAX_SYNC_SIZE = int(os.environ.get("MAGRATHEA_MAX_SYNC_SIZE", 4096))
+# Largest map a job renders. Jobs stream their rendering band by band, but the
+# encoded PNG is still held in memory whole.
+MAX_JOB_SIZE = int(os.environ.get("MAGRATHEA_MAX_JOB_SIZE", 16384))
+# Each octave costs a full pass over the map, and octaves past the 7th only
+# repeat the noise lattice (BASE_FREQUENCY 4 doubles past its PERIOD of 256);
+# past about 1000 the frequency overflows and the map comes out as NaN.
+MAX_OCTAVES = 16
+Octaves = Annotated[int, Field(gt=0, le=MAX_OCTAVES)]
+# Seeds must be non-negative for NumPy's generators and fit the 64-bit column.
+MAX_SEED = 2**63 - 1
+Seed = Annotated[int, Field(ge=0, le=MAX_SEED)]
+
+# Seconds between job state checks while streaming job events.
+JOB_EVENTS_POLL_INTERVAL = 0.25
+# Suggested client back-off when the job queue is full.
+JOB_RETRY_AFTER = 5
+
+
+class WorldMapRequest(BaseModel):
+    size: int = Field(gt=0, le=MAX_SYNC_SIZE)
+    seed_height: Seed
+    seed_heat: Seed
+    seed_wet: Seed
+
 
 class MapRequest(BaseModel):
-    size: int
-    seed_height: int
-    seed_heat: int
-    seed_wet: int
+    size: int = Field(128, gt=0)
+    octaves: Octaves = 4
+    seed: Seed | None = None
+    island_density: float = 0.0
+    # Store only the parameters and serve the map as tiles, for maps too large
+    # to render as a single image.
+    tiled: bool = False
+    # Also keep the raw heightmap, served by /maps/{id}/heightmap.
+    store_heightmap: bool = False
+
+
+class JobRequest(BaseModel):
+    # Options of POST /maps that jobs don't support are rejected, not ignored.
+    model_config = ConfigDict(extra="forbid")
+
+    size: int = Field(128, gt=0, le=MAX_JOB_SIZE)
+    octaves: Octaves = 4
+    seed: Seed | None = None
+    island_density: float = 0.0
+
+
+class MapBatchRequest(BaseModel):
+    size: int = Field(128, gt=0, le=MAX_SYNC_SIZE)
+    octaves: Octaves = 4
+    # Either explicit seeds or a number of random ones.
+    seeds: list[Seed] | None = Field(None, min_length=1, max_length=MAX_BATCH_MAPS)
+    count: int = Field(1, gt=0, le=MAX_BATCH_MAPS)
+    island_density: float = 0.0
 
 
 class MapResponse(BaseModel):
     id: str
     url: str
+    tiles_url: str
+
+
+def map_response(map_id: str) -> MapResponse:
+    return MapResponse(
+        id=map_id,
+        url=f"/maps/{map_id}",
+        tiles_url=f"/maps/{map_id}/tiles/{{z}}/{{x}}/{{y}}.png",
+    )
+
+
+class JobResponse(BaseModel):
+    id: str
+    status: JobStatus
+    url: str | None = None
+    error: str | None = None
+
+
+class Encoding(NamedTuple):
+    format: OutputFormat
+    # zlib-style compression level, or None for the format's default.
+    level: int | None
+
+    @property
+    def is_default(self) -> bool:
+        """Whether this is the PNG that is stored and streamed by default."""
+        return self.format == DEFAULT_FORMAT and self.level is None
+
+    @property
+    def variant(self) -> dict[str, object]:
+        return {} if self.is_default else {"format": self.format, "level": self.level}
 
 
-@map_router.get("/map")
+def get_encoding(
+    format: OutputFormat | None = None,
+    level: Annotated[int | None, Query(ge=0, le=MAX_COMPRESSION_LEVEL)] = None,
+    accept: Annotated[str | None, Header()] = None,
+) -> Encoding:
+    """The output format from `format`, else negotiated from `Accept`."""
+    return Encoding(format or negotiate_format(accept), level)
+
+
+def encoding_headers(encoding: Encoding, size: int) -> dict[str, str]:
+    # The format may be negotiated, so caches must key responses on Accept.
+    headers = {"Vary": "Accept"}
+    if encoding.format == "raw":
+        headers["X-Heightmap-Dtype"] = np.dtype(HEIGHTMAP_DTYPE).str
+        headers["X-Heightmap-Shape"] = f"{size},{size}"
+    return headers
+
+
+def encode_heightmap(heightmap: npt.NDArray[np.float64], encoding: Encoding) -> bytes:
+    level = PNG_COMPRESSION_LEVEL if encoding.level is None else encoding.level
+    return encode(heightmap, encoding.format, level)
+
+
+@map_router.get("/map_form")
 async def form(request: Request) -> Response:
     return templates.TemplateResponse("map_form.html", {"request": request})
 
 
-@map_router.post("/map_create")
-async def create(request: Request, map_request: MapRequest) -> Response:
-    # map = WorldMap(
-    #     size=map_request.size,
-    #     seed_height=map_request.seed_height,
-    #     seed_heat=map_request.seed_heat,
-    #     seed_wet=map_request.seed_wet,
-    # )
+@map_router.post("/map_create", response_class=Response)
+def create(map_request: WorldMapRequest) -> Response:
+    """Renders the biome map of a world as a PNG.
 
-    return templates.TemplateResponse("map_response.html", {"request": request})
+    Fields are shared through the layer cache, so re-submitting the form with
+    one seed changed only recomputes that seed's field.
+    """
+    world = WorldMap(
+        size=map_request.size,
+        seed_height=map_request.seed_height,
+        seed_heat=map_request.seed_heat,
+        seed_wet=map_request.seed_wet,
+    )
+    return Response(content=world.render_png(), media_type="image/png")
 
 
 @map_router.post("/map_view")
@@ -46,101 +236,482 @@ async def view_map() -> None:
     pass
 
 
-# @map_router.get("/map", response_class=StreamingResponse)
-# def quick_generate_map(
-#     size: int = 128,
-#     octaves: int = 4,
-#     seed: int | None = None,
-#     island_density: float = 0.0,
-# ) -> StreamingResponse:
-#     """Generates and returns a map PNG directly (ephemeral, no DB storage)."""
-#     logger.info(
-#         f"GET /map: size={size}, octaves={octaves}, seed={seed}, "
-#         f"density={island_density}"
-#     )
-#     try:
-#         buf = render_map_to_buffer(
-#             size, octaves, seed=seed, island_density=island_density
-#         )
-#         return StreamingResponse(buf, media_type="image/png")
-#     except Exception as e:
-#         logger.error(f"Failed to generate map: {e}")
-#         raise HTTPException(status_code=500, detail=str(e)) from e
-
-
-# @map_router.post("/maps", response_model=MapResponse)
-# def create_map(request: MapRequest, db: Session = Depends(get_db)) -> MapResponse:
-#     """Generates a map and stores it in the database."""
-#     logger.info(
-#         f"POST /maps: size={request.size}, octaves={request.octaves}, "
-#         f"seed={request.seed}, density={request.island_density}"
-#     )
-#     try:
-#         # Check for pre-generated map if seed is not specified
-#         if request.seed is None:
-#             pre_gen_map = (
-#                 db.query(Map)
-#                 .filter(
-#                     Map.is_pregenerated == True,
-#                     Map.size == request.size,
-#                     Map.octaves == request.octaves,
-#                     Map.island_density == request.island_density,
-#                 )
-#                 .first()
-#             )
-
-#             if pre_gen_map:
-#                 logger.info(f"Using pre-generated map: {pre_gen_map.id}")
-#                 pre_gen_map.is_pregenerated = False
-#                 db.commit()
-#                 return MapResponse(id=pre_gen_map.id, url=f"/maps/{pre_gen_map.id}")
-
-#         # Generate the map buffer
-#         buf = render_map_to_buffer(
-#             request.size,
-#             request.octaves,
-#             seed=request.seed,
-#             island_density=request.island_density,
-#         )
-
-#         # Create a unique ID
-#         map_id = str(uuid.uuid4())
-
-#         # Create DB record
-#         new_map = Map(
-#             id=map_id,
-#             size=request.size,
-#             octaves=request.octaves,
-#             seed=request.seed,
-#             island_density=request.island_density,
-#             data=buf.getvalue(),
-#         )
-
-#         db.add(new_map)
-#         db.commit()
-#         db.refresh(new_map)
-
-#         logger.info(f"Map created successfully. ID: {map_id}")
-#         return MapResponse(id=map_id, url=f"/maps/{map_id}")
-#     except Exception as e:
-#         logger.error(f"Failed to create map: {e}")
-#         raise HTTPException(status_code=500, detail=str(e)) from e
-
-
-# @map_router.get("/maps/{map_id}")
-# def get_map(map_id: str, db: Session = Depends(get_db)) -> StreamingResponse:
-#     """Retrieves a generated map by ID."""
-#     logger.debug(f"Retrieving map with ID: {map_id}")
-
-#     map_record = db.query(Map).filter(Map.id == map_id).first()
-
-#     if not map_record:
-#         logger.warning(f"Map ID not found: {map_id}")
-#         raise HTTPException(status_code=404, detail="Map not found")
-
-#     # Create buffer from binary data
-#     assert map_record.data is not None
-#     buf = io.BytesIO(map_record.data)
-
-#     # Return as streaming response
-#     return StreamingResponse(buf, media_type="image/png")
+@map_router.get("/map", response_class=StreamingResponse)
+def quick_generate_map(
+    encoding: Annotated[Encoding, Depends(get_encoding)],
+    conditions: Annotated[Conditions, Depends(get_conditions)],
+    size: Annotated[int, Query(gt=0, le=MAX_SYNC_SIZE)] = 128,
+    octaves: Annotated[int, Query(gt=0, le=MAX_OCTAVES)] = 4,
+    seed: Annotated[int | None, Query(ge=0, le=MAX_SEED)] = None,
+    island_density: float = 0.0,
+) -> Response:
+    """Generates and returns a map image directly (ephemeral, no DB storage).
+
+    The default PNG is encoded band by band while it is sent, so the client
+    starts receiving bytes before the whole map has been generated. Other
+    formats are chosen with `format` or the `Accept` header, and `level`
+    trades CPU for bytes. Seeded maps are served from the render cache when
+    available and added to it otherwise; their noise is kept in the layer
+    cache, so a follow-up request that only changes `island_density` skips
+    regenerating it. Seeded maps never change, so they carry an ETag derived
+    from their parameters and are cacheable forever.
+    """
+    logger.info(
+        f"GET /map: size={size}, octaves={octaves}, seed={seed}, "
+        f"density={island_density}, format={encoding.format}"
+    )
+    media_type = ENCODERS[encoding.format].media_type
+    headers = encoding_headers(encoding, size)
+
+    def render() -> bytes:
+        if seed is not None and size <= LAYER_MAX_SIZE:
+            heightmap = layered_heightmap(size, octaves, seed, island_density)
+        else:
+            heightmap = generate_heightmap(size, octaves, seed, island_density)
+        return encode_heightmap(heightmap, encoding)
+
+    if seed is None:
+        headers["Cache-Control"] = NO_STORE
+        if not encoding.is_default:
+            return Response(content=render(), media_type=media_type, headers=headers)
+        chunks = iter_map_png(size, octaves, island_density=island_density)
+        return StreamingResponse(chunks, media_type=media_type, headers=headers)
+
+    key = cache_key(size, octaves, seed, island_density, **encoding.variant)
+    etag = strong_etag(key)
+    if not encoding.is_default:
+        return cacheable_response(
+            conditions,
+            etag,
+            lambda: render_cache.get_or_render(key, render),
+            media_type,
+            headers,
+        )
+
+    if etag_matches(conditions.if_none_match, etag):
+        return not_modified(etag, headers)
+    cached = render_cache.get(key)
+    if cached is not None:
+        return cacheable_response(conditions, etag, lambda: cached, media_type, headers)
+    if size <= LAYER_MAX_SIZE:
+        heightmap = layered_heightmap(size, octaves, seed, island_density)
+        chunks = iter_heightmap_png(heightmap)
+    else:
+        chunks = iter_map_png(size, octaves, seed=seed, island_density=island_density)
+    return StreamingResponse(
+        render_cache.store_stream(key, chunks),
+        media_type=media_type,
+        headers=validator_headers(etag, headers),
+    )
+
+
+@map_router.post("/maps", response_model=MapResponse)
+def create_map(
+    request: MapRequest,
+    db: Annotated[Session, Depends(get_db)],
+    blobs: Annotated[BlobStore, Depends(get_blob_store)],
+) -> MapResponse:
+    """Generates a map and stores it in the database."""
+    logger.info(
+        f"POST /maps: size={request.size}, octaves={request.octaves}, "
+        f"seed={request.seed}, density={request.island_density}"
+    )
+    if request.tiled and request.store_heightmap:
+        raise HTTPException(
+            status_code=422, detail="Tiled maps cannot store a raw heightmap"
+        )
+    if not request.tiled and request.size > MAX_SYNC_SIZE:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Maps larger than {MAX_SYNC_SIZE}px must be tiled "
+            "or created with POST /jobs",
+        )
+    try:
+        # Check for pre-generated map if seed is not specified
+        if request.seed is None and not request.tiled and not request.store_heightmap:
+            pre_gen_id = claim_pregenerated_map(
+                db, request.size, request.octaves, request.island_density
+            )
+
+            if pre_gen_id:
+                logger.info(f"Using pre-generated map: {pre_gen_id}")
+                return map_response(pre_gen_id)
+
+        # Fix the seed so the map can be regenerated, tile by tile or whole
+        seed = request.seed if request.seed is not None else random.randint(0, 1000000)
+        new_map = Map(
+            id=str(uuid.uuid4()),
+            size=request.size,
+            octaves=request.octaves,
+            seed=seed,
+            island_density=request.island_density,
+        )
+
+        if not request.tiled:
+            if request.seed is not None and not request.store_heightmap:
+                images = render_map_images_cached(
+                    request.size, request.octaves, seed, request.island_density
+                )
+            else:
+                heightmap = generate_heightmap(
+                    request.size,
+                    request.octaves,
+                    seed=seed,
+                    island_density=request.island_density,
+                )
+                # The full image and its mipmaps all come from one heightmap.
+                images = encode_map_images(heightmap)
+                if request.store_heightmap:
+                    raw = blobs.put(
+                        encode_array(heightmap.astype(HEIGHTMAP_DTYPE)), ".npy"
+                    )
+                    new_map.heightmap_key = raw.key
+            blob = blobs.put(images.png)
+            new_map.blob_key = blob.key
+            new_map.byte_size = blob.byte_size
+            new_map.content_hash = blob.content_hash
+            new_map.levels = store_levels(blobs, images.mipmaps)
+
+        db.add(new_map)
+        with timed("db_write"):
+            db.commit()
+        db.refresh(new_map)
+
+        logger.info(f"Map created successfully. ID: {new_map.id}")
+        return map_response(new_map.id)
+    except Exception as e:
+        logger.error(f"Failed to create map: {e}")
+        raise HTTPException(status_code=500, detail=str(e)) from e
+
+
+@map_router.post("/maps/batch", response_model=list[MapResponse])
+def create_maps(
+    request: MapBatchRequest,
+    db: Annotated[Session, Depends(get_db)],
+    blobs: Annotated[BlobStore, Depends(get_blob_store)],
+) -> list[MapResponse]:
+    """Generates and stores one map per seed, in batched kernel calls.
+
+    All maps are inserted in a single transaction, so either every map of the
+    batch is created or none is.
+    """
+    seeds = request.seeds
+    if seeds is None:
+        seeds = [random.randint(0, 1000000) for _ in range(request.count)]
+    logger.info(
+        f"POST /maps/batch: {len(seeds)} maps, size={request.size}, "
+        f"octaves={request.octaves}, density={request.island_density}"
+    )
+
+    new_maps = []
+    images = iter_map_images(
+        request.size, request.octaves, seeds, request.island_density
+    )
+    for seed, map_images in zip(seeds, images, strict=True):
+        blob = blobs.put(map_images.png)
+        new_maps.append(
+            Map(
+                id=str(uuid.uuid4()),
+                size=request.size,
+                octaves=request.octaves,
+                seed=seed,
+                island_density=request.island_density,
+                blob_key=blob.key,
+                byte_size=blob.byte_size,
+                content_hash=blob.content_hash,
+                levels=store_levels(blobs, map_images.mipmaps),
+            )
+        )
+    db.add_all(new_maps)
+    with timed("db_write"):
+        db.commit()
+
+    return [map_response(new_map.id) for new_map in new_maps]
+
+
+@map_router.get("/maps/{map_id}")
+def get_map(
+    map_id: str,
+    db: Annotated[Session, Depends(get_db)],
+    blobs: Annotated[BlobStore, Depends(get_blob_store)],
+    encoding: Annotated[Encoding, Depends(get_encoding)],
+    conditions: Annotated[Conditions, Depends(get_conditions)],
+    max_px: Annotated[int | None, Query(gt=0)] = None,
+) -> Response:
+    """Retrieves a generated map by ID.
+
+    With `max_px`, the largest stored mipmap level no wider than `max_px` is
+    sent instead of the full image (the smallest level if none is that
+    small). Other formats, chosen with `format` or the `Accept` header, are
+    rendered from the map's seed on first request and then cached; maps
+    without a seed are always sent as their stored PNG. Stored maps
+    never change: responses carry a strong ETag, are cacheable forever and
+    support conditional and byte-range requests. Locally stored images are
+    sent straight from disk.
+    """
+    logger.debug(f"Retrieving map with ID: {map_id}")
+
+    map_record = db.query(Map).filter(Map.id == map_id).first()
+
+    if not map_record:
+        logger.warning(f"Map ID not found: {map_id}")
+        raise HTTPException(status_code=404, detail="Map not found")
+    if map_record.blob_key is None:
+        raise HTTPException(status_code=404, detail="Map is only available as tiles")
+    # Other encodings are rendered from the seed, so maps stored without one,
+    # or with more octaves than may be rendered, are only served as their PNG.
+    if (
+        not encoding.is_default
+        and map_record.seed is not None
+        and map_record.octaves <= MAX_OCTAVES
+    ):
+        return encoded_map(map_record, map_record.seed, encoding, conditions, max_px)
+    encoding = Encoding(DEFAULT_FORMAT, None)
+
+    blob_key = map_record.blob_key
+    content_hash = map_record.content_hash
+    if max_px is not None and max_px < map_record.size and map_record.levels:
+        fitting = [level for level in map_record.levels if level.size <= max_px]
+        level = fitting[-1] if fitting else map_record.levels[0]
+        blob_key = level.blob_key
+        content_hash = level.content_hash
+
+    etag = strong_etag(content_hash or blob_key)
+    headers = encoding_headers(encoding, map_record.size)
+    if etag_matches(conditions.if_none_match, etag):
+        return not_modified(etag, headers)
+    path = blobs.local_path(blob_key)
+    if path is not None:
+        return FileResponse(
+            path, media_type="image/png", headers=validator_headers(etag, headers)
+        )
+    return cacheable_response(
+        conditions, etag, lambda: blobs.get(blob_key), "image/png", headers
+    )
+
+
+def encoded_map(
+    map_record: Map,
+    seed: int,
+    encoding: Encoding,
+    conditions: Conditions,
+    max_px: int | None,
+) -> Response:
+    """A stored map re-rendered from `seed` in a non-default encoding, cached."""
+    size = map_record.size
+    octaves = map_record.octaves
+    island_density = map_record.island_density or 0.0
+    out_size = size if max_px is None else mip_size(size, max_px)
+
+    def render() -> bytes:
+        heightmap = generate_heightmap(size, octaves, seed, island_density)
+        while len(heightmap) > out_size:
+            heightmap = downsample(heightmap)
+        return encode_heightmap(heightmap, encoding)
+
+    key = cache_key(
+        size, octaves, seed, island_density, out_size=out_size, **encoding.variant
+    )
+    return cacheable_response(
+        conditions,
+        strong_etag(key),
+        lambda: render_cache.get_or_render(key, render),
+        ENCODERS[encoding.format].media_type,
+        encoding_headers(encoding, out_size),
+    )
+
+
+@map_router.get("/maps/{map_id}/heightmap")
+def get_map_heightmap(
+    map_id: str,
+    db: Annotated[Session, Depends(get_db)],
+    blobs: Annotated[BlobStore, Depends(get_blob_store)],
+    format: Literal["raw", "npy"] = "raw",
+) -> Response:
+    """Serves a map's stored raw heightmap.
+
+    `raw` streams the bare array bytes, described by the `X-Heightmap-Dtype`
+    (a NumPy dtype string) and `X-Heightmap-Shape` headers; `npy` returns the
+    `.npy` file itself, ready for `np.load`. The array is memory-mapped, so
+    only the rows being sent are read from disk.
+    """
+    map_record = db.query(Map).filter(Map.id == map_id).first()
+    if not map_record:
+        raise HTTPException(status_code=404, detail="Map not found")
+    if map_record.heightmap_key is None:
+        raise HTTPException(status_code=404, detail="Map has no stored heightmap")
+
+    if format == "npy":
+        path = blobs.local_path(map_record.heightmap_key)
+        if path is not None:
+            return FileResponse(path, media_type="application/octet-stream")
+        return Response(
+            content=blobs.get(map_record.heightmap_key),
+            media_type="application/octet-stream",
+        )
+
+    heightmap = load_array(blobs, map_record.heightmap_key)
+
+    def rows() -> Iterator[bytes]:
+        for start in range(0, len(heightmap), STREAM_BAND_ROWS):
+            yield heightmap[start : start + STREAM_BAND_ROWS].tobytes()
+
+    headers = {
+        "Content-Length": str(heightmap.nbytes),
+        "X-Heightmap-Dtype": heightmap.dtype.str,
+        "X-Heightmap-Shape": ",".join(map(str, heightmap.shape)),
+    }
+    return StreamingResponse(
+        rows(), media_type="application/octet-stream", headers=headers
+    )
+
+
+@map_router.get("/maps/{map_id}/tiles/{z}/{x}/{y}.png")
+def get_map_tile(
+    map_id: str,
+    z: int,
+    x: int,
+    y: int,
+    db: Annotated[Session, Depends(get_db)],
+    conditions: Annotated[Conditions, Depends(get_conditions)],
+) -> Response:
+    """Serves one XYZ tile of a map, generating and caching it on first request.
+
+    Zoom 0 shows the whole map in a single tile; the deepest zoom shows it at
+    full resolution. Only the requested tile's window of noise is computed.
+    Tiles never change, so they are sent with an ETag and cacheable forever.
+    """
+    map_record = db.query(Map).filter(Map.id == map_id).first()
+    if not map_record:
+        raise HTTPException(status_code=404, detail="Map not found")
+    if map_record.seed is None:
+        raise HTTPException(status_code=404, detail="Map has no seed to tile from")
+    if map_record.octaves > MAX_OCTAVES:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Maps with more than {MAX_OCTAVES} octaves cannot be tiled",
+        )
+    if not 0 <= z <= max_zoom(map_record.size):
+        raise HTTPException(status_code=404, detail="Zoom level out of range")
+    tiles = 1 << z
+    if not (0 <= x < tiles and 0 <= y < tiles):
+        raise HTTPException(status_code=404, detail="Tile out of range")
+
+    params = (
+        map_record.size,
+        map_record.octaves,
+        map_record.seed,
+        map_record.island_density or 0.0,
+        z,
+        x,
+        y,
+    )
+    return cacheable_response(
+        conditions,
+        strong_etag(tile_cache_key(*params)),
+        lambda: render_tile_cached(*params),
+        "image/png",
+    )
+
+
+@map_router.post("/jobs", response_model=JobResponse, status_code=202)
+def create_job(
+    request: JobRequest, queue: Annotated[JobQueue, Depends(get_job_queue)]
+) -> JobResponse:
+    """Queues a map for generation and returns its job at once.
+
+    Poll `GET /jobs/{id}` or follow `GET /jobs/{id}/events` until the job is
+    done; its `url` then serves the stored map, as `GET /maps/{id}` with the
+    job's id. Responds 429 while the queue is full.
+    """
+    seed = request.seed if request.seed is not None else random.randint(0, 1000000)
+    job = MapJob(
+        size=request.size,
+        octaves=request.octaves,
+        seed=seed,
+        island_density=request.island_density,
+    )
+    try:
+        queue.enqueue(job)
+    except QueueFullError as e:
+        logger.warning(f"Rejected job: {e}")
+        raise HTTPException(
+            status_code=429,
+            detail="Too many queued maps, retry later",
+            headers={"Retry-After": str(JOB_RETRY_AFTER)},
+        ) from e
+    logger.info(f"POST /jobs: queued {job.id} (size={job.size}, seed={job.seed})")
+    return JobResponse(id=job.id, status="queued")
+
+
+@map_router.get("/jobs/{job_id}", response_model=JobResponse)
+def get_job(
+    job_id: str, queue: Annotated[JobQueue, Depends(get_job_queue)]
+) -> JobResponse:
+    """Reports the status of a map job, with the map URL once it is done."""
+    state = queue.get_state(job_id)
+    if state is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return JobResponse(id=job_id, status=state.status, url=state.url, error=state.error)
+
+
+@map_router.get("/jobs/{job_id}/events", response_class=StreamingResponse)
+async def job_events(
+    job_id: str, queue: Annotated[JobQueue, Depends(get_job_queue)]
+) -> Response:
+    """Streams a job's state as server-sent events until it is done or failed."""
+    if await asyncio.to_thread(queue.get_state, job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def events() -> AsyncIterator[str]:
+        last = None
+        while True:
+            state = await asyncio.to_thread(queue.get_state, job_id)
+            if state is None:
+                return
+            if state != last:
+                response = JobResponse(
+                    id=job_id, status=state.status, url=state.url, error=state.error
+                )
+                yield f"event: {state.status}\ndata: {response.model_dump_json()}\n\n"
+                last = state
+            if state.status in ("done", "failed"):
+                return
+            await asyncio.sleep(JOB_EVENTS_POLL_INTERVAL)
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@map_router.get("/metrics")
+def get_metrics(
+    db: Annotated[Session, Depends(get_db)],
+    queue: Annotated[JobQueue, Depends(get_job_queue)],
+) -> Response:
+    """Prometheus metrics: stage timings, render cache, pool and queue depth."""
+    hits = cache_lookups.value("hit")
+    lookups = hits + cache_lookups.value("miss")
+    pools = {
+        f"{bucket.size}:{bucket.octaves}:{bucket.island_density}": pool_level(
+            db, bucket
+        )
+        for bucket in parse_buckets(POOL_BUCKETS)
+    }
+    body = render_metrics(
+        [
+            stage_seconds.render(),
+            cache_lookups.render(),
+            gauge(
+                "magrathea_render_cache_hit_ratio",
+                "Share of render cache lookups that hit since startup.",
+                hits / lookups if lookups else 0.0,
+            ),
+            gauge(
+                "magrathea_pool_maps",
+                "Unclaimed pre-generated maps in each pool bucket.",
+                pools,
+                "bucket",
+            ),
+            gauge("magrathea_job_queue_length", "Map jobs waiting to run.", len(queue)),
+        ]
+    )
+    return Response(content=body, media_type=METRICS_CONTENT_TYPE)
@@ -0,0 +1,338 @@
+import argparse
+import json
+import multiprocessing
+import platform
+import resource
+import sys
+import time
+import tracemalloc
+from collections.abc import Callable, Iterable
+from concurrent.futures import ProcessPoolExecutor
+from datetime import UTC, datetime
+from pathlib import Path
+from typing import Any, NamedTuple
+
+import numpy as np
+from loguru import logger
+
+from magrathea.maps.rendering_engine import (
+    ENGINE_VERSION,
+    colorize,
+    generate_heightmap,
+    iter_heightmap_png,
+    render_map_to_buffer,
+)
+
+BENCHMARK_SIZES = (64, 256, 1024, 4096, 8192)
+BENCHMARK_OCTAVES = (1, 4, 8)
+# A subset quick enough to run on every change.
+QUICK_SIZES = (64, 256)
+QUICK_OCTAVES = (1, 4)
+BENCHMARK_SEED = 42
+DEFAULT_REPEAT = 3
+# Relative slowdown (or growth in allocations) reported as a regression.
+REGRESSION_THRESHOLD = 0.25
+# Metrics compared against the baseline, each with the smallest absolute growth
+# that counts, below which tiny maps would flag mere timer noise. Lower is
+# better for all of them.
+COMPARED_METRICS = {"seconds": 0.001, "allocated_peak_bytes": 64 * 1024}
+
+# ru_maxrss is in kilobytes on Linux but in bytes on macOS.
+_MAXRSS_UNIT = 1 if sys.platform == "darwin" else 1024
+
+
+def bench_heightmap(size: int, octaves: int) -> Callable[[], object]:
+    return lambda: generate_heightmap(size, octaves, BENCHMARK_SEED)
+
+
+def bench_colorize(size: int, octaves: int) -> Callable[[], object]:
+    heightmap = generate_heightmap(size, octaves, BENCHMARK_SEED)
+    return lambda: colorize(heightmap)
+
+
+def bench_png(size: int, octaves: int) -> Callable[[], object]:
+    heightmap = generate_heightmap(size, octaves, BENCHMARK_SEED)
+    return lambda: b"".join(iter_heightmap_png(heightmap))
+
+
+def bench_render(size: int, octaves: int) -> Callable[[], object]:
+    return lambda: render_map_to_buffer(size, octaves, BENCHMARK_SEED)
+
+
+def max_http_size() -> int:
+    """Largest map `GET /map` renders; the app rejects bigger ones."""
+    from magrathea.maps.api import MAX_SYNC_SIZE
+
+    return MAX_SYNC_SIZE
+
+
+def bench_http(size: int, octaves: int) -> Callable[[], object]:
+    """`GET /map` through the whole app, unseeded so no cache can answer it."""
+    from fastapi.testclient import TestClient
+
+    from magrathea.main import app
+
+    client = TestClient(app)
+    url = f"/map?size={size}&octaves={octaves}"
+
+    def request() -> object:
+        # Per-request logging would otherwise be part of what is measured.
+        logger.disable("magrathea.maps.api")
+        try:
+            response = client.get(url)
+        finally:
+            logger.enable("magrathea.maps.api")
+        response.raise_for_status()
+        return response
+
+    return request
+
+
+# Each benchmark prepares its inputs and returns the call to be timed.
+BENCHMARKS: dict[str, Callable[[int, int], Callable[[], object]]] = {
+    "heightmap": bench_heightmap,
+    "colorize": bench_colorize,
+    "png": bench_png,
+    "render": bench_render,
+    "http": bench_http,
+}
+
+
+class Result(NamedTuple):
+    benchmark: str
+    size: int
+    octaves: int
+    # Fastest of the timed runs, which is the least disturbed by other load.
+    seconds: float
+    mean_seconds: float
+    # High-water mark of the whole process, interpreter and imports included.
+    peak_rss_bytes: int
+    # Peak of the memory allocated during one run, as traced by tracemalloc.
+    allocated_peak_bytes: int
+
+    @property
+    def key(self) -> tuple[str, int, int]:
+        return self.benchmark, self.size, self.octaves
+
+
+class Regression(NamedTuple):
+    benchmark: str
+    size: int
+    octaves: int
+    metric: str
+    baseline: float
+    current: float
+
+    @property
+    def ratio(self) -> float:
+        return self.current / self.baseline
+
+
+def measure(benchmark: str, size: int, octaves: int, repeat: int) -> Result:
+    """Times one benchmark after a warm-up call, then traces one more run.
+
+    The warm-up compiles any Numba kernels and fills per-size caches, so the
+    timings are of the steady state a long-running server sees.
+    """
+    run = BENCHMARKS[benchmark](size, octaves)
+    run()
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+
+    # Traced separately, since tracing slows allocation-heavy code down.
+    tracemalloc.start()
+    try:
+        run()
+        _, allocated_peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return Result(
+        benchmark=benchmark,
+        size=size,
+        octaves=octaves,
+        seconds=min(times),
+        mean_seconds=sum(times) / len(times),
+        peak_rss_bytes=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        * _MAXRSS_UNIT,
+        allocated_peak_bytes=allocated_peak,
+    )
+
+
+def run_benchmarks(
+    benchmarks: Iterable[str],
+    sizes: Iterable[int],
+    octaves: Iterable[int],
+    repeat: int = DEFAULT_REPEAT,
+    isolate: bool = True,
+) -> list[Result]:
+    """Measures every benchmark at every size and octave count.
+
+    With `isolate`, each measurement runs alone in a fresh process, so its
+    peak RSS is its own and not that of the largest map measured before it.
+    """
+    cases = [
+        (benchmark, size, count)
+        for benchmark in benchmarks
+        for size in sizes
+        for count in octaves
+    ]
+    rejected = [
+        case for case in cases if case[0] == "http" and case[1] > max_http_size()
+    ]
+    for benchmark, size, count in rejected:
+        logger.warning(
+            f"Skipping {benchmark} at {size}px, {count} octaves: "
+            "larger than MAGRATHEA_MAX_SYNC_SIZE"
+        )
+    cases = [case for case in cases if case not in rejected]
+    results = []
+    if not isolate:
+        for case in cases:
+            results.append(measure(*case, repeat))
+            logger.info(format_result(results[-1]))
+        return results
+
+    # Spawned rather than forked, for the same reason as the pool workers.
+    with ProcessPoolExecutor(
+        max_workers=1,
+        mp_context=multiprocessing.get_context("spawn"),
+        max_tasks_per_child=1,
+    ) as executor:
+        for case in cases:
+            results.append(executor.submit(measure, *case, repeat).result())
+            logger.info(format_result(results[-1]))
+    return results
+
+
+def format_result(result: Result) -> str:
+    return (
+        f"{result.benchmark:<10} {result.size:>5}px {result.octaves} octaves: "
+        f"{result.seconds * 1000:10.2f} ms, "
+        f"peak RSS {result.peak_rss_bytes / 2**20:7.1f} MiB, "
+        f"allocated {result.allocated_peak_bytes / 2**20:7.1f} MiB"
+    )
+
+
+def compare(
+    results: Iterable[Result],
+    baseline: Iterable[Result],
+    threshold: float = REGRESSION_THRESHOLD,
+) -> list[Regression]:
+    """Metrics that grew by more than `threshold` relative to `baseline`.
+
+    Measurements missing from the baseline are not compared.
+    """
+    previous = {result.key: result for result in baseline}
+    regressions = []
+    for result in results:
+        before = previous.get(result.key)
+        if before is None:
+            continue
+        for metric, min_growth in COMPARED_METRICS.items():
+            old, new = getattr(before, metric), getattr(result, metric)
+            if new > old * (1 + threshold) and new - old >= min_growth:
+                regressions.append(Regression(*result.key, metric, old, new))
+    return regressions
+
+
+def save_results(path: Path, results: Iterable[Result]) -> None:
+    document = {
+        "created_at": datetime.now(UTC).isoformat(),
+        "engine_version": ENGINE_VERSION,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "cpu_count": multiprocessing.cpu_count(),
+        "results": [result._asdict() for result in results],
+    }
+    path.write_text(json.dumps(document, indent=2) + "\n")
+
+
+def load_results(path: Path) -> list[Result]:
+    document: dict[str, Any] = json.loads(path.read_text())
+    return [Result(**result) for result in document["results"]]
+
+
+def cli() -> None:
+    parser = argparse.ArgumentParser(
+        description="Benchmark map generation and compare against a baseline."
+    )
+    parser.add_argument(
+        "--benchmarks",
+        default=",".join(BENCHMARKS),
+        help="Comma-separated benchmarks to run",
+    )
+    parser.add_argument(
+        "--sizes", help="Comma-separated map sizes (default: 64 to 8192)"
+    )
+    parser.add_argument("--octaves", help="Comma-separated octave counts")
+    parser.add_argument(
+        "--quick",
+        action="store_true",
+        help="Only the small sizes and octave counts, for frequent runs",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=DEFAULT_REPEAT, help="Timed runs per case"
+    )
+    parser.add_argument(
+        "--in-process",
+        action="store_true",
+        help="Measure everything in this process; faster, but peak RSS is shared",
+    )
+    parser.add_argument(
+        "--output",
+        type=Path,
+        default=Path("benchmark-results.json"),
+        help="Where to write the results",
+    )
+    parser.add_argument(
+        "--baseline", type=Path, help="Earlier results to compare against"
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=REGRESSION_THRESHOLD,
+        help="Relative growth reported as a regression",
+    )
+    args = parser.parse_args()
+
+    def parse_ints(value: str | None, default: Iterable[int]) -> list[int]:
+        return [int(v) for v in value.split(",")] if value else list(default)
+
+    benchmarks = args.benchmarks.split(",")
+    unknown = set(benchmarks) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+    sizes = parse_ints(args.sizes, QUICK_SIZES if args.quick else BENCHMARK_SIZES)
+    octaves = parse_ints(
+        args.octaves, QUICK_OCTAVES if args.quick else BENCHMARK_OCTAVES
+    )
+
+    results = run_benchmarks(
+        benchmarks, sizes, octaves, args.repeat, isolate=not args.in_process
+    )
+    save_results(args.output, results)
+    logger.info(f"Wrote {len(results)} results to {args.output}")
+
+    if args.baseline is None:
+        return
+    regressions = compare(results, load_results(args.baseline), args.threshold)
+    for regression in regressions:
+        logger.error(
+            f"Regression in {regression.benchmark} at {regression.size}px, "
+            f"{regression.octaves} octaves: {regression.metric} "
+            f"{regression.baseline:.4g} -> {regression.current:.4g} "
+            f"({regression.ratio:.2f}x)"
+        )
+    if regressions:
+        sys.exit(1)
+    logger.info(f"No regressions against {args.baseline}")
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,86 @@
+import hashlib
+import io
+import os
+import tempfile
+from pathlib import Path
+from typing import Any, NamedTuple, Protocol
+
+import numpy as np
+import numpy.typing as npt
+
+BLOB_DIR = os.environ.get("MAGRATHEA_BLOB_DIR", "./blobs")
+
+
+class BlobRef(NamedTuple):
+    key: str
+    byte_size: int
+    content_hash: str
+
+
+class BlobStore(Protocol):
+    """Storage for map images, addressed by the key returned from `put`."""
+
+    def put(self, data: bytes, suffix: str = ".png") -> BlobRef: ...
+
+    def get(self, key: str) -> bytes: ...
+
+    def local_path(self, key: str) -> Path | None:
+        """Filesystem path of the blob, or None if the store isn't local."""
+        ...
+
+
+class LocalBlobStore:
+    """Blobs stored as files under `root`, at paths derived from their SHA-256.
+
+    Identical content always maps to the same file, so storing a blob twice
+    costs nothing. Writes are atomic, so readers never see partial files.
+    """
+
+    def __init__(self, root: str | Path) -> None:
+        self.root = Path(root)
+
+    def put(self, data: bytes, suffix: str = ".png") -> BlobRef:
+        content_hash = hashlib.sha256(data).hexdigest()
+        key = f"{content_hash[:2]}/{content_hash[2:4]}/{content_hash}{suffix}"
+        path = self.root / key
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        return BlobRef(key=key, byte_size=len(data), content_hash=content_hash)
+
+    def get(self, key: str) -> bytes:
+        return (self.root / key).read_bytes()
+
+    def local_path(self, key: str) -> Path | None:
+        return self.root / key
+
+
+def encode_array(array: npt.NDArray[Any]) -> bytes:
+    """Serializes `array` in the `.npy` format."""
+    buf = io.BytesIO()
+    np.save(buf, array, allow_pickle=False)
+    return buf.getvalue()
+
+
+def load_array(blobs: BlobStore, key: str) -> npt.NDArray[Any]:
+    """Opens a `.npy` blob, memory-mapped read-only when the store is local.
+
+    A mapped array is paged in from disk as it is read, so opening it costs
+    nothing up front and only the parts actually used are ever loaded.
+    """
+    path = blobs.local_path(key)
+    source = path if path is not None else io.BytesIO(blobs.get(key))
+    array: npt.NDArray[Any] = np.load(
+        source, mmap_mode="r" if path is not None else None, allow_pickle=False
+    )
+    return array
+
+
+blob_store = LocalBlobStore(BLOB_DIR)
+
+
+def get_blob_store() -> BlobStore:
+    return blob_store
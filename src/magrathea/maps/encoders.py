@@ -0,0 +1,118 @@
+import io
+from collections.abc import Callable
+from typing import Literal, NamedTuple
+
+import numpy as np
+import numpy.typing as npt
+
+from magrathea.maps.palettes import SEA_SAND_GRASS_LUT, lut_indices
+from magrathea.maps.rendering_engine import (
+    HEIGHTMAP_DTYPE,
+    PNG_COMPRESSION_LEVEL,
+    STREAM_BAND_ROWS,
+    colorize,
+    iter_heightmap_png,
+    iter_png,
+)
+from magrathea.metrics import timed
+
+type OutputFormat = Literal["png", "png8", "webp", "raw"]
+
+DEFAULT_FORMAT: OutputFormat = "png"
+# Highest compression level; every format maps 0-9 onto its own effort scale.
+MAX_COMPRESSION_LEVEL = 9
+
+
+# The palette's distinct colours, and the entry of each LUT index among them.
+# Flat colour regions then share one index, which is what lets them compress.
+PALETTE, PALETTE_INDEX = np.unique(SEA_SAND_GRASS_LUT, axis=0, return_inverse=True)
+PALETTE_INDEX = PALETTE_INDEX.astype(np.uint8)
+
+
+class Encoder(NamedTuple):
+    media_type: str
+    # Encodes a heightmap at a compression level from 0 (fastest) to 9.
+    encode: Callable[[npt.NDArray[np.float64], int], bytes]
+
+
+def encode_png(heightmap: npt.NDArray[np.float64], level: int) -> bytes:
+    """24-bit RGB PNG, as served by default."""
+    return b"".join(iter_heightmap_png(heightmap, level=level))
+
+
+def encode_palette_png(heightmap: npt.NDArray[np.float64], level: int) -> bytes:
+    """8-bit palette PNG: the same pixels in a third of the raw data."""
+    size = len(heightmap)
+    bands = (
+        PALETTE_INDEX[lut_indices(heightmap[start : start + STREAM_BAND_ROWS])]
+        for start in range(0, size, STREAM_BAND_ROWS)
+    )
+    return b"".join(iter_png(size, size, bands, level, palette=PALETTE))
+
+
+def encode_webp(heightmap: npt.NDArray[np.float64], level: int) -> bytes:
+    """Lossless WebP, usually the smallest of the image formats."""
+    # Pillow is only needed here, so only processes serving WebP load it.
+    from PIL import Image
+
+    buf = io.BytesIO()
+    method = round(level * 6 / MAX_COMPRESSION_LEVEL)
+    image = Image.fromarray(colorize(heightmap))
+    with timed("encode"):
+        image.save(buf, format="WEBP", lossless=True, method=method)
+    return buf.getvalue()
+
+
+def encode_raw(heightmap: npt.NDArray[np.float64], level: int) -> bytes:
+    """The bare float32 elevations, row by row; `level` is ignored."""
+    return heightmap.astype(HEIGHTMAP_DTYPE).tobytes()
+
+
+ENCODERS: dict[OutputFormat, Encoder] = {
+    "png": Encoder("image/png", encode_png),
+    "png8": Encoder("image/png", encode_palette_png),
+    "webp": Encoder("image/webp", encode_webp),
+    "raw": Encoder("application/octet-stream", encode_raw),
+}
+
+
+def encode(
+    heightmap: npt.NDArray[np.float64],
+    format: OutputFormat = DEFAULT_FORMAT,
+    level: int = PNG_COMPRESSION_LEVEL,
+) -> bytes:
+    return ENCODERS[format].encode(heightmap, level)
+
+
+def negotiate_format(accept: str | None) -> OutputFormat:
+    """Picks the format best matching an `Accept` header, PNG by default.
+
+    Another format is only chosen when the header does not accept PNG at all,
+    so browsers, which send `*/*` alongside the image types they support, get
+    the stored PNG. Otherwise media ranges are tried in order of their `q`
+    weights, and unsupported types fall back to PNG.
+    """
+    if not accept:
+        return DEFAULT_FORMAT
+    ranges = []
+    for position, entry in enumerate(accept.split(",")):
+        media_type, *params = (part.strip() for part in entry.split(";"))
+        weight = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        if weight > 0:
+            ranges.append((-weight, position, media_type.lower()))
+
+    accepts_png = {"*/*", "image/*", ENCODERS[DEFAULT_FORMAT].media_type}
+    if any(media_type in accepts_png for _, _, media_type in ranges):
+        return DEFAULT_FORMAT
+    for _, _, media_type in sorted(ranges):
+        for name, encoder in ENCODERS.items():
+            if encoder.media_type == media_type:
+                return name
+    return DEFAULT_FORMAT
@@ -0,0 +1,116 @@
+from collections.abc import Callable
+from typing import Annotated, NamedTuple
+
+from fastapi import Header, Response
+
+# For responses that never change: stored maps and seeded renders.
+IMMUTABLE = "public, max-age=31536000, immutable"
+# For unseeded renders, which differ on every request.
+NO_STORE = "no-store"
+
+
+class Conditions(NamedTuple):
+    """The request's conditional and range headers."""
+
+    if_none_match: str | None = None
+    range: str | None = None
+    if_range: str | None = None
+
+
+def get_conditions(
+    if_none_match: Annotated[str | None, Header()] = None,
+    range: Annotated[str | None, Header()] = None,
+    if_range: Annotated[str | None, Header()] = None,
+) -> Conditions:
+    return Conditions(if_none_match, range, if_range)
+
+
+def strong_etag(token: str) -> str:
+    """A strong ETag for content identified by `token`, e.g. its hash."""
+    return f'"{token}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Whether an `If-None-Match` header matches `etag` (weak comparison)."""
+    if if_none_match is None:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(
+        tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(",")
+    )
+
+
+def validator_headers(etag: str, extra: dict[str, str] | None = None) -> dict[str, str]:
+    return {"ETag": etag, "Cache-Control": IMMUTABLE, **(extra or {})}
+
+
+def not_modified(etag: str, headers: dict[str, str] | None = None) -> Response:
+    return Response(status_code=304, headers=validator_headers(etag, headers))
+
+
+def parse_range(range_header: str, length: int) -> tuple[int, int] | None:
+    """The inclusive byte span of a single-range `Range` header.
+
+    Returns None when the header should be ignored (another unit, several
+    ranges or bad syntax) and raises ValueError when it is unsatisfiable.
+    """
+    unit, _, spec = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, dash, last = spec.strip().partition("-")
+    if not dash or not (first.isdigit() or last.isdigit()):
+        return None
+    if first and last and not (first.isdigit() and last.isdigit()):
+        return None
+    if not first:
+        # A suffix range: the last `last` bytes.
+        suffix = int(last)
+        if suffix == 0:
+            raise ValueError("empty suffix range")
+        return max(length - suffix, 0), length - 1
+    start = int(first)
+    end = int(last) if last else length - 1
+    if last and end < start:
+        return None
+    if start >= length:
+        raise ValueError("range starts beyond the content")
+    return start, min(end, length - 1)
+
+
+def cacheable_response(
+    conditions: Conditions,
+    etag: str,
+    render: Callable[[], bytes],
+    media_type: str,
+    headers: dict[str, str] | None = None,
+) -> Response:
+    """Serves immutable content under `etag`, honouring conditions and ranges.
+
+    A matching `If-None-Match` is answered 304 without calling `render`. A
+    single byte range is answered 206 unless `If-Range` names another
+    representation.
+    """
+    if etag_matches(conditions.if_none_match, etag):
+        return not_modified(etag, headers)
+    data = render()
+    headers = validator_headers(etag, {"Accept-Ranges": "bytes", **(headers or {})})
+    if conditions.range is None or conditions.if_range not in (None, etag):
+        return Response(content=data, media_type=media_type, headers=headers)
+    try:
+        span = parse_range(conditions.range, len(data))
+    except ValueError:
+        return Response(
+            status_code=416,
+            headers={**headers, "Content-Range": f"bytes */{len(data)}"},
+        )
+    if span is None:
+        return Response(content=data, media_type=media_type, headers=headers)
+    start, end = span
+    headers["Content-Range"] = f"bytes {start}-{end}/{len(data)}"
+    return Response(
+        content=data[start : end + 1],
+        status_code=206,
+        media_type=media_type,
+        headers=headers,
+    )
@@ -0,0 +1,236 @@
+import argparse
+import os
+import threading
+import uuid
+from collections.abc import Callable
+from typing import Literal
+
+from loguru import logger
+from pydantic import BaseModel, Field
+from sqlalchemy.orm import Session
+
+from magrathea.database import SessionLocal
+from magrathea.maps.blob_store import BlobStore, blob_store
+from magrathea.maps.map import Map
+from magrathea.maps.render_cache import (
+    RenderCache,
+    cache_key,
+    render_cache,
+    render_map_cached,
+)
+from magrathea.metrics import timed
+from magrathea.redis_store import InMemoryStore, KeyValueStore, store
+
+JOB_QUEUE_NAME = "magrathea:jobs"
+JOB_STATE_TTL = 24 * 60 * 60
+JOB_QUEUE_MAX_DEPTH = int(os.environ.get("MAGRATHEA_JOB_QUEUE_MAX_DEPTH", 32))
+# Render threads started in the web process when no shared queue is configured.
+JOB_WORKERS = int(os.environ.get("MAGRATHEA_JOB_WORKERS", 1))
+
+type JobStatus = Literal["queued", "running", "done", "failed"]
+
+
+class MapJob(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    size: int
+    octaves: int
+    seed: int
+    island_density: float = 0.0
+
+    @property
+    def cache_key(self) -> str:
+        return cache_key(self.size, self.octaves, self.seed, self.island_density)
+
+    @property
+    def url(self) -> str:
+        """URL serving the map once the job is done; it is stored under the job id."""
+        return f"/maps/{self.id}"
+
+
+class JobState(BaseModel):
+    status: JobStatus
+    cache_key: str
+    url: str | None = None
+    error: str | None = None
+
+
+class QueueFullError(Exception):
+    """Raised when a job is enqueued on a queue already at its maximum depth."""
+
+
+class JobQueue:
+    """FIFO of map-generation jobs kept in a Redis-compatible store.
+
+    Any worker with access to the store can consume jobs, and job states are
+    readable from every replica while they live. At most `max_depth` jobs wait
+    at once; the depth check is not atomic with the push, so concurrent
+    producers may briefly overshoot it by a few jobs.
+    """
+
+    def __init__(
+        self,
+        store: KeyValueStore,
+        name: str = JOB_QUEUE_NAME,
+        max_depth: int = JOB_QUEUE_MAX_DEPTH,
+    ) -> None:
+        self.store = store
+        self.name = name
+        self.max_depth = max_depth
+
+    def _state_key(self, job_id: str) -> str:
+        return f"{self.name}:state:{job_id}"
+
+    def __len__(self) -> int:
+        return self.store.llen(self.name)
+
+    def enqueue(self, job: MapJob) -> MapJob:
+        if len(self) >= self.max_depth:
+            raise QueueFullError(f"{self.name} already holds {self.max_depth} jobs")
+        self.set_state(job.id, JobState(status="queued", cache_key=job.cache_key))
+        self.store.lpush(self.name, job.model_dump_json())
+        return job
+
+    def dequeue(self, timeout: float = 0) -> MapJob | None:
+        """Pops the oldest job, blocking for up to `timeout` seconds (0: forever)."""
+        item = self.store.brpop([self.name], timeout=timeout)
+        if item is None:
+            return None
+        return MapJob.model_validate_json(item[1])
+
+    def set_state(self, job_id: str, state: JobState) -> None:
+        self.store.set(
+            self._state_key(job_id), state.model_dump_json(), ex=JOB_STATE_TTL
+        )
+
+    def get_state(self, job_id: str) -> JobState | None:
+        data = self.store.get(self._state_key(job_id))
+        if data is None:
+            return None
+        return JobState.model_validate_json(data)
+
+
+def process_job(
+    queue: JobQueue,
+    job: MapJob,
+    session_factory: Callable[[], Session] = SessionLocal,
+    blobs: BlobStore = blob_store,
+    cache: RenderCache = render_cache,
+) -> None:
+    """Renders `job` and stores it as a map, recording its progress in `queue`.
+
+    The map is rendered band by band, as job maps may be far larger than
+    those rendered within a request, so it is stored without mipmap levels.
+    """
+    queue.set_state(job.id, JobState(status="running", cache_key=job.cache_key))
+    try:
+        png = render_map_cached(
+            job.size, job.octaves, job.seed, job.island_density, cache=cache
+        )
+        blob = blobs.put(png)
+        with session_factory() as db:
+            db.add(
+                Map(
+                    id=job.id,
+                    size=job.size,
+                    octaves=job.octaves,
+                    seed=job.seed,
+                    island_density=job.island_density,
+                    blob_key=blob.key,
+                    byte_size=blob.byte_size,
+                    content_hash=blob.content_hash,
+                )
+            )
+            with timed("db_write"):
+                db.commit()
+    except Exception as e:
+        logger.error(f"Job {job.id} failed: {e}")
+        queue.set_state(
+            job.id, JobState(status="failed", cache_key=job.cache_key, error=str(e))
+        )
+        return
+    queue.set_state(
+        job.id, JobState(status="done", cache_key=job.cache_key, url=job.url)
+    )
+
+
+def run_worker(
+    queue: JobQueue,
+    poll_timeout: float = 5,
+    stop: threading.Event | None = None,
+    session_factory: Callable[[], Session] = SessionLocal,
+    blobs: BlobStore = blob_store,
+) -> None:
+    """Processes jobs from `queue` until interrupted or `stop` is set."""
+    logger.info(f"Render worker consuming {queue.name}")
+    while stop is None or not stop.is_set():
+        job = queue.dequeue(timeout=poll_timeout)
+        if job is not None:
+            process_job(queue, job, session_factory, blobs)
+
+
+class WorkerThreads:
+    """Render workers running as threads of the current process.
+
+    Used when there is no shared queue for `render-worker` processes to
+    consume, so the web process renders its own jobs off the event loop.
+    """
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        count: int = JOB_WORKERS,
+        poll_timeout: float = 0.5,
+        session_factory: Callable[[], Session] = SessionLocal,
+        blobs: BlobStore = blob_store,
+    ) -> None:
+        self.queue = queue
+        self.count = count
+        self.poll_timeout = poll_timeout
+        self.session_factory = session_factory
+        self.blobs = blobs
+        self._stop = threading.Event()
+        self._threads: list[threading.Thread] = []
+
+    def start(self) -> None:
+        self._stop.clear()
+        for i in range(self.count):
+            thread = threading.Thread(
+                target=run_worker,
+                args=(
+                    self.queue,
+                    self.poll_timeout,
+                    self._stop,
+                    self.session_factory,
+                    self.blobs,
+                ),
+                name=f"render-worker-{i}",
+                daemon=True,
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self) -> None:
+        """Stops the workers once their current jobs finish."""
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+
+job_queue = JobQueue(store if store is not None else InMemoryStore())
+
+
+def get_job_queue() -> JobQueue:
+    return job_queue
+
+
+def cli() -> None:
+    parser = argparse.ArgumentParser(description="Render queued map jobs.")
+    parser.add_argument(
+        "--queue", default=JOB_QUEUE_NAME, help="Name of the job queue to consume"
+    )
+    args = parser.parse_args()
+
+    if store is None:
+        parser.error("MAGRATHEA_REDIS_URL must be set to consume a shared queue")
+    run_worker(JobQueue(store, args.queue))
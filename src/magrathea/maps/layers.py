@@ -0,0 +1,127 @@
+import os
+import threading
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+from typing import Any
+
+import numpy as np
+import numpy.typing as npt
+
+from magrathea.maps.rendering_engine import (
+    default_workers,
+    island_mask,
+    map_coordinates,
+    octave_noise,
+)
+from magrathea.metrics import timed
+
+LAYER_CACHE_BYTES = int(
+    os.environ.get("MAGRATHEA_LAYER_CACHE_BYTES", 256 * 1024 * 1024)
+)
+# Largest map whose layers are kept; bigger maps are rendered band by band.
+LAYER_MAX_SIZE = int(os.environ.get("MAGRATHEA_LAYER_MAX_SIZE", 2048))
+
+
+class LayerCache:
+    """In-process LRU of intermediate arrays, keyed by the inputs they depend on.
+
+    Cached arrays are made read-only, since every caller gets the same one.
+    """
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._entries: OrderedDict[Hashable, npt.NDArray[Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_or_compute(
+        self, key: Hashable, compute: Callable[[], npt.NDArray[Any]]
+    ) -> npt.NDArray[Any]:
+        with self._lock:
+            layer = self._entries.get(key)
+            if layer is not None:
+                self._entries.move_to_end(key)
+                return layer
+
+        # Computed outside the lock; two threads missing the same key at once
+        # both compute it, which wastes time but not correctness.
+        layer = compute()
+        layer.setflags(write=False)
+        if layer.nbytes > self.max_bytes:
+            return layer
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = layer
+                self.nbytes += layer.nbytes
+            while self.nbytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.nbytes -= evicted.nbytes
+        return layer
+
+    def discard(self, key: Hashable) -> None:
+        """Evicts the layer under `key`, if it is cached."""
+        with self._lock:
+            layer = self._entries.pop(key, None)
+            if layer is not None:
+                self.nbytes -= layer.nbytes
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+
+layer_cache = LayerCache(LAYER_CACHE_BYTES)
+
+
+def noise_layer(
+    size: int, octaves: int, seed: int, cache: LayerCache = layer_cache
+) -> npt.NDArray[np.float64]:
+    """Raw octave sums in [-1, 1] for a `size` map, before any shaping."""
+
+    def compute() -> npt.NDArray[np.float64]:
+        coords = map_coordinates(size)
+        with timed("noise"):
+            return octave_noise(coords, coords, octaves, seed, default_workers(size))
+
+    return cache.get_or_compute(("noise", size, octaves, seed), compute)
+
+
+def compose_heightmap(
+    noise: npt.NDArray[np.float64],
+    mask: npt.NDArray[np.float64],
+    island_density: float,
+) -> npt.NDArray[np.float64]:
+    """Shapes raw noise into a heightmap, as `heightmap_rows` does.
+
+    Only cheap element-wise passes run here, so changing `island_density`
+    costs a few milliseconds however expensive the noise was.
+    """
+    with timed("normalize"):
+        heightmap = noise + 1.0
+        heightmap *= 0.5
+        heightmap += island_density
+        heightmap *= mask
+        np.clip(heightmap, 0.0, 1.0, out=heightmap)
+    return heightmap
+
+
+def layered_heightmap(
+    size: int,
+    octaves: int,
+    seed: int,
+    island_density: float = 0.0,
+    cache: LayerCache = layer_cache,
+) -> npt.NDArray[np.float64]:
+    """`generate_heightmap`, reusing whichever layers are already cached.
+
+    The result is identical to `generate_heightmap`; only the layers whose
+    inputs changed since an earlier call are recomputed.
+    """
+    noise = noise_layer(size, octaves, seed, cache)
+    with timed("mask"):
+        mask = island_mask(size)
+    return compose_heightmap(noise, mask, island_density)
@@ -1,7 +1,8 @@
-from sqlalchemy import Boolean, Float, Integer, LargeBinary, String
-from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy import BigInteger, Boolean, Float, ForeignKey, Index, Integer, String
+from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from magrathea.database import Base
+from magrathea.maps.blob_store import BlobStore
 
 
 class Map(Base):
@@ -10,7 +11,59 @@ class Map(Base):
     id: Mapped[str] = mapped_column(String, primary_key=True, index=True)
     size: Mapped[int] = mapped_column(Integer)
     octaves: Mapped[int] = mapped_column(Integer)
-    seed: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    seed: Mapped[int | None] = mapped_column(BigInteger, nullable=True)
     island_density: Mapped[float | None] = mapped_column(Float, nullable=True)
     is_pregenerated: Mapped[bool] = mapped_column(Boolean, default=False)
-    data: Mapped[bytes] = mapped_column(LargeBinary)
+    # The image itself lives in the blob store; see magrathea.maps.blob_store.
+    # Tiled maps have no full image and are only served as tiles.
+    blob_key: Mapped[str | None] = mapped_column(String, nullable=True)
+    byte_size: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    content_hash: Mapped[str | None] = mapped_column(String, nullable=True)
+    # Optional raw float32 heightmap, stored as a `.npy` blob.
+    heightmap_key: Mapped[str | None] = mapped_column(String, nullable=True)
+    levels: Mapped[list["MapLevel"]] = relationship(
+        back_populates="map", cascade="all, delete-orphan", order_by="MapLevel.size"
+    )
+
+
+class MapLevel(Base):
+    """A downsampled copy of a map's image, for previews and thumbnails."""
+
+    __tablename__ = "map_levels"
+
+    map_id: Mapped[str] = mapped_column(
+        ForeignKey("maps.id", ondelete="CASCADE"), primary_key=True
+    )
+    size: Mapped[int] = mapped_column(Integer, primary_key=True)
+    blob_key: Mapped[str] = mapped_column(String)
+    byte_size: Mapped[int] = mapped_column(Integer)
+    content_hash: Mapped[str] = mapped_column(String)
+    map: Mapped[Map] = relationship(back_populates="levels")
+
+
+def store_levels(blobs: BlobStore, mipmaps: list[tuple[int, bytes]]) -> list[MapLevel]:
+    """Puts each `(size, png)` mipmap in `blobs` and returns rows for them."""
+    levels = []
+    for size, data in mipmaps:
+        blob = blobs.put(data)
+        levels.append(
+            MapLevel(
+                size=size,
+                blob_key=blob.key,
+                byte_size=blob.byte_size,
+                content_hash=blob.content_hash,
+            )
+        )
+    return levels
+
+
+# Serves pool lookups, which only ever look at pre-generated maps; the partial
+# index stays as small as the pool rather than growing with every stored map.
+Index(
+    "ix_maps_pool",
+    Map.size,
+    Map.octaves,
+    Map.island_density,
+    sqlite_where=Map.is_pregenerated.is_(True),
+    postgresql_where=Map.is_pregenerated.is_(True),
+)
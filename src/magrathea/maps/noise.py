@@ -0,0 +1,166 @@
+import numpy as np
+import numpy.typing as npt
+from numba import get_num_threads, njit, prange
+
+# Size of the lattice permutation; noise repeats every PERIOD units.
+PERIOD = 256
+# Rows handed to each task by the parallel kernel.
+BAND_ROWS = 32
+# Threads available to the parallel kernel, as configured by NUMBA_NUM_THREADS.
+MAX_THREADS = get_num_threads()
+
+
+def permutation_table(seed: int) -> npt.NDArray[np.int64]:
+    """Seeded lattice permutation, doubled so corner lookups never wrap."""
+    perm = np.random.default_rng(seed).permutation(PERIOD).astype(np.int64)
+    return np.concatenate((perm, perm))
+
+
+@njit(cache=True, inline="always")
+def _fade(t: float) -> float:
+    return t * t * t * (t * (t * 6.0 - 15.0) + 10.0)
+
+
+@njit(cache=True, inline="always")
+def _gradient(h: int, x: float, y: float) -> float:
+    u = -x if h & 1 else x
+    v = -y if h & 2 else y
+    return u + v
+
+
+@njit(cache=True, inline="always")
+def _perlin(x: float, y: float, perm: npt.NDArray[np.int64]) -> float:
+    x0 = np.floor(x)
+    y0 = np.floor(y)
+    xf = x - x0
+    yf = y - y0
+    xi = int(x0) & (PERIOD - 1)
+    yi = int(y0) & (PERIOD - 1)
+
+    a = perm[xi] + yi
+    b = perm[xi + 1] + yi
+    n00 = _gradient(perm[a], xf, yf)
+    n10 = _gradient(perm[b], xf - 1.0, yf)
+    n01 = _gradient(perm[a + 1], xf, yf - 1.0)
+    n11 = _gradient(perm[b + 1], xf - 1.0, yf - 1.0)
+
+    u = _fade(xf)
+    v = _fade(yf)
+    x1 = n00 + u * (n10 - n00)
+    x2 = n01 + u * (n11 - n01)
+    return x1 + v * (x2 - x1)
+
+
+@njit(cache=True, inline="always")
+def _fill_rows(
+    x: npt.NDArray[np.float64],
+    y: npt.NDArray[np.float64],
+    octaves: int,
+    persistence: float,
+    lacunarity: float,
+    perm: npt.NDArray[np.int64],
+    out: npt.NDArray[np.float64],
+    start: int,
+    stop: int,
+) -> None:
+    amplitude_sum = 0.0
+    amplitude = 1.0
+    for _ in range(octaves):
+        amplitude_sum += amplitude
+        amplitude *= persistence
+
+    for i in range(start, stop):
+        for j in range(x.size):
+            total = 0.0
+            amplitude = 1.0
+            frequency = 1.0
+            for _ in range(octaves):
+                total += amplitude * _perlin(x[j] * frequency, y[i] * frequency, perm)
+                amplitude *= persistence
+                frequency *= lacunarity
+            out[i, j] = total / amplitude_sum
+
+
+@njit(cache=True)
+def fractal_noise(
+    x: npt.NDArray[np.float64],
+    y: npt.NDArray[np.float64],
+    octaves: int,
+    persistence: float,
+    lacunarity: float,
+    perm: npt.NDArray[np.int64],
+    out: npt.NDArray[np.float64],
+) -> None:
+    """Writes octave-summed Perlin noise over the grid `y` x `x` into `out`.
+
+    Every pixel accumulates all of its octaves in registers, so the grid is
+    traversed once regardless of `octaves`. Values lie in [-1, 1].
+    """
+    _fill_rows(x, y, octaves, persistence, lacunarity, perm, out, 0, y.size)
+
+
+@njit(cache=True, parallel=True)
+def fractal_noise_parallel(
+    x: npt.NDArray[np.float64],
+    y: npt.NDArray[np.float64],
+    octaves: int,
+    persistence: float,
+    lacunarity: float,
+    perm: npt.NDArray[np.int64],
+    out: npt.NDArray[np.float64],
+) -> None:
+    """Multi-threaded `fractal_noise`, splitting the grid into row bands.
+
+    Bands run the same per-pixel arithmetic as the serial kernel and write
+    straight into their slice of `out`, so the result is bit-identical and
+    needs no stitching.
+    """
+    bands = (y.size + BAND_ROWS - 1) // BAND_ROWS
+    for band in prange(bands):
+        start = band * BAND_ROWS
+        stop = min(start + BAND_ROWS, y.size)
+        _fill_rows(x, y, octaves, persistence, lacunarity, perm, out, start, stop)
+
+
+@njit(cache=True)
+def fractal_noise_batch(
+    x: npt.NDArray[np.float64],
+    y: npt.NDArray[np.float64],
+    octaves: int,
+    persistence: float,
+    lacunarity: float,
+    perms: npt.NDArray[np.int64],
+    out: npt.NDArray[np.float64],
+) -> None:
+    """`fractal_noise` for a stack of permutation tables, one per map in `out`.
+
+    The grid is shared by every map, so a batch costs one call instead of one
+    per seed. `out[k]` is identical to `fractal_noise` with `perms[k]`.
+    """
+    for k in range(perms.shape[0]):
+        _fill_rows(x, y, octaves, persistence, lacunarity, perms[k], out[k], 0, y.size)
+
+
+@njit(cache=True, parallel=True)
+def fractal_noise_batch_parallel(
+    x: npt.NDArray[np.float64],
+    y: npt.NDArray[np.float64],
+    octaves: int,
+    persistence: float,
+    lacunarity: float,
+    perms: npt.NDArray[np.int64],
+    out: npt.NDArray[np.float64],
+) -> None:
+    """Multi-threaded `fractal_noise_batch`, over row bands of every map.
+
+    Splitting each map into bands keeps all threads busy whether the batch
+    holds a few large maps or many small ones.
+    """
+    bands = (y.size + BAND_ROWS - 1) // BAND_ROWS
+    for task in prange(perms.shape[0] * bands):
+        k = task // bands
+        start = (task % bands) * BAND_ROWS
+        stop = min(start + BAND_ROWS, y.size)
+        _fill_rows(
+            x, y, octaves, persistence, lacunarity, perms[k], out[k], start, stop
+        )
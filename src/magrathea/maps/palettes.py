@@ -0,0 +1,76 @@
+from collections.abc import Sequence
+from typing import Any
+
+import numpy as np
+import numpy.typing as npt
+
+# Entries in every palette lookup table.
+LUT_SIZE = 256
+
+type ColorStop = tuple[float, str]
+
+SEA_SAND_GRASS: list[ColorStop] = [
+    (0.0, "#1f4fff"),  # blue (deep water)
+    (0.4, "#1f4fff"),  # blue (deep water)
+    (0.5, "#f5e663"),  # yellow (sand)
+    (0.55, "#4caf50"),  # green (grass)
+    (0.8, "#0b3d0b"),  # dark green (dense forest)
+    (1.0, "#0b3d0b"),  # dark green (dense forest)
+]
+
+
+def hex_to_rgb(color: str) -> tuple[float, float, float]:
+    """Converts a `#rrggbb` string to RGB floats in [0, 1]."""
+    return (
+        int(color[1:3], 16) / 255,
+        int(color[3:5], 16) / 255,
+        int(color[5:7], 16) / 255,
+    )
+
+
+def build_lut(
+    stops: Sequence[ColorStop], size: int = LUT_SIZE
+) -> npt.NDArray[np.uint8]:
+    """Interpolates colour stops into a `(size, 3)` uint8 lookup table.
+
+    Sampling and rounding follow matplotlib's
+    `LinearSegmentedColormap.from_list(..., N=size)` step for step, so a
+    palette renders exactly as it does with that colormap in the notebook.
+    """
+    x = np.array([value for value, _ in stops]) * (size - 1)
+    rgb = np.array([hex_to_rgb(color) for _, color in stops])
+
+    xind = (size - 1) * np.linspace(0, 1, size)
+    ind = np.searchsorted(x, xind)[1:-1]
+    distance = (xind[1:-1] - x[ind - 1]) / (x[ind] - x[ind - 1])
+
+    lut = np.empty((size, 3))
+    lut[0] = rgb[0]
+    lut[1:-1] = distance[:, np.newaxis] * (rgb[ind] - rgb[ind - 1]) + rgb[ind - 1]
+    lut[-1] = rgb[-1]
+    np.clip(lut, 0.0, 1.0, out=lut)
+    return (lut * 255).astype(np.uint8)
+
+
+def lut_indices(
+    values: npt.NDArray[np.float64], size: int = LUT_SIZE
+) -> npt.NDArray[Any]:
+    """Entries of a `size`-entry lookup table that colour `values` in [0, 1]."""
+    index = values * size
+    np.minimum(index, size - 1, out=index)
+    np.maximum(index, 0, out=index)
+    return index.astype(np.uint8 if size <= 256 else np.intp)
+
+
+def apply_lut(
+    values: npt.NDArray[np.float64], lut: npt.NDArray[np.uint8]
+) -> npt.NDArray[np.uint8]:
+    """Colours `values` in [0, 1] by indexing into `lut`.
+
+    Returns an array of shape `values.shape + (3,)`.
+    """
+    colours: npt.NDArray[np.uint8] = lut[lut_indices(values, len(lut))]
+    return colours
+
+
+SEA_SAND_GRASS_LUT = build_lut(SEA_SAND_GRASS)
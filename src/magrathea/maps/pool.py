@@ -0,0 +1,38 @@
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from magrathea.maps.map import Map
+from magrathea.metrics import timed
+
+
+def claim_pregenerated_map(
+    db: Session, size: int, octaves: int, island_density: float
+) -> str | None:
+    """Atomically takes a matching map out of the pre-generated pool.
+
+    The lookup and the flip of `is_pregenerated` happen in one UPDATE ...
+    RETURNING statement, so concurrent requests can never claim the same map.
+    On Postgres, rows locked by another claim are skipped rather than waited
+    on. Returns the claimed map's ID, or None if the pool has no match.
+    """
+    candidate = (
+        select(Map.id)
+        .where(
+            Map.is_pregenerated.is_(True),
+            Map.size == size,
+            Map.octaves == octaves,
+            Map.island_density == island_density,
+        )
+        .limit(1)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    map_id = db.execute(
+        update(Map)
+        .where(Map.id == candidate, Map.is_pregenerated.is_(True))
+        .values(is_pregenerated=False)
+        .returning(Map.id)
+    ).scalar_one_or_none()
+    with timed("db_write"):
+        db.commit()
+    return map_id
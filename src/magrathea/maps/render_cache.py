@@ -0,0 +1,408 @@
+import hashlib
+import json
+import os
+import secrets
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Iterator
+from pathlib import Path
+
+from loguru import logger
+
+from magrathea.maps.rendering_engine import (
+    ENGINE_VERSION,
+    TILE_SIZE,
+    MapImages,
+    encode_map_images,
+    generate_heightmap,
+    mip_sizes,
+    render_map_to_buffer,
+    render_tile_png,
+)
+from magrathea.metrics import cache_lookups, timed
+from magrathea.redis_store import KeyValueStore, store
+
+RENDER_CACHE_DIR = os.environ.get("MAGRATHEA_RENDER_CACHE_DIR", "./render_cache")
+RENDER_CACHE_MEMORY_BYTES = int(
+    os.environ.get("MAGRATHEA_RENDER_CACHE_MEMORY_BYTES", 64 * 1024 * 1024)
+)
+RENDER_CACHE_DISK_BYTES = int(
+    os.environ.get("MAGRATHEA_RENDER_CACHE_DISK_BYTES", 1024 * 1024 * 1024)
+)
+RENDER_CACHE_SHARED_TTL = int(
+    os.environ.get("MAGRATHEA_RENDER_CACHE_SHARED_TTL", 24 * 60 * 60)
+)
+# Lifetime of a render lock; a worker that dies mid-render blocks others this long.
+RENDER_LOCK_TIMEOUT = 60
+RENDER_LOCK_POLL_INTERVAL = 0.05
+
+
+def _hash_params(params: dict[str, object]) -> str:
+    params = {"engine": ENGINE_VERSION, **params}
+    return hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()
+
+
+def cache_key(
+    size: int, octaves: int, seed: int, island_density: float, **variant: object
+) -> str:
+    """Content address of a render: a hash of its parameters and engine version.
+
+    `variant` distinguishes other outputs of the same map, such as another
+    encoding; the default PNG render has none.
+    """
+    return _hash_params(
+        {
+            "size": size,
+            "octaves": octaves,
+            "seed": seed,
+            "island_density": island_density,
+            **variant,
+        }
+    )
+
+
+def tile_cache_key(
+    size: int, octaves: int, seed: int, island_density: float, z: int, x: int, y: int
+) -> str:
+    """Content address of one tile of a map's tile pyramid."""
+    return _hash_params(
+        {
+            "size": size,
+            "octaves": octaves,
+            "seed": seed,
+            "island_density": island_density,
+            "tile": [TILE_SIZE, z, x, y],
+        }
+    )
+
+
+class MemoryCache:
+    """In-process LRU cache bounded by the total size of its values."""
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._entries: OrderedDict[str, bytes] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> bytes | None:
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+            return data
+
+    def put(self, key: str, data: bytes) -> None:
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.nbytes -= len(previous)
+            self._entries[key] = data
+            self.nbytes += len(data)
+            while self.nbytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.nbytes -= len(evicted)
+
+
+class DiskCache:
+    """Directory of rendered files, evicting the least recently used when full.
+
+    Files are written atomically, so several workers can share a directory.
+    Reads refresh a file's mtime, which eviction uses as its recency.
+    """
+
+    def __init__(self, directory: str | Path, max_bytes: int) -> None:
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self._nbytes: int | None = None
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / key
+
+    def _files(self) -> list[Path]:
+        if not self.directory.exists():
+            return []
+        return [p for p in self.directory.glob("*/*") if p.is_file()]
+
+    def get(self, key: str) -> bytes | None:
+        path = self._path(key)
+        try:
+            data = path.read_bytes()
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return data
+
+    def put(self, key: str, data: bytes) -> None:
+        if len(data) > self.max_bytes:
+            return
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+        with self._lock:
+            if self._nbytes is None:
+                self._nbytes = sum(p.stat().st_size for p in self._files())
+            else:
+                self._nbytes += len(data)
+            if self._nbytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        entries = []
+        for p in self._files():
+            try:
+                stat = p.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, p))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+        self._nbytes = total
+
+
+class SharedCache:
+    """Cache tier in a Redis-compatible store shared by all workers and replicas.
+
+    Besides storing renders it hands out short-lived render locks, so only one
+    worker generates a given map while the others wait for its result.
+    """
+
+    def __init__(
+        self,
+        store: KeyValueStore,
+        ttl: int = RENDER_CACHE_SHARED_TTL,
+        prefix: str = "magrathea:render:",
+    ) -> None:
+        self.store = store
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, key: str) -> bytes | None:
+        return self.store.get(self.prefix + key)
+
+    def put(self, key: str, data: bytes) -> None:
+        self.store.set(self.prefix + key, data, ex=self.ttl)
+
+    def claim(self, key: str) -> str | None:
+        """Takes the render lock for `key`, returning the token to release it.
+
+        Returns None if another worker holds the lock.
+        """
+        token = secrets.token_hex(16)
+        lock = f"{self.prefix}lock:{key}"
+        if self.store.set(lock, token, ex=RENDER_LOCK_TIMEOUT, nx=True):
+            return token
+        return None
+
+    def release(self, key: str, token: str) -> None:
+        """Drops the render lock for `key` if it is still the one `token` took.
+
+        A render outliving `RENDER_LOCK_TIMEOUT` loses its lock to another
+        worker, whose lock must not be dropped when the first one finishes.
+        """
+        lock = f"{self.prefix}lock:{key}"
+        if self.store.get(lock) == token.encode():
+            self.store.delete(lock)
+
+
+class RenderCache:
+    """Tiered cache of rendered maps: memory, then disk, then the shared store."""
+
+    def __init__(
+        self,
+        memory: MemoryCache,
+        disk: DiskCache | None = None,
+        shared: SharedCache | None = None,
+    ) -> None:
+        self.memory = memory
+        self.disk = disk
+        self.shared = shared
+
+    def get(self, key: str) -> bytes | None:
+        with timed("cache_lookup"):
+            data = self._lookup(key)
+        cache_lookups.inc("miss" if data is None else "hit")
+        return data
+
+    def _lookup(self, key: str) -> bytes | None:
+        data = self.memory.get(key)
+        if data is not None:
+            return data
+        if self.disk is not None:
+            data = self.disk.get(key)
+            if data is not None:
+                self.memory.put(key, data)
+                return data
+        if self.shared is not None:
+            data = self.shared.get(key)
+            if data is not None:
+                self.memory.put(key, data)
+                if self.disk is not None:
+                    self.disk.put(key, data)
+        return data
+
+    def put(self, key: str, data: bytes) -> None:
+        self.memory.put(key, data)
+        if self.disk is not None:
+            self.disk.put(key, data)
+        if self.shared is not None:
+            self.shared.put(key, data)
+
+    def _wait_for_shared(
+        self, shared: SharedCache, key: str
+    ) -> tuple[bytes | None, str | None]:
+        """Polls for another worker's render of `key`.
+
+        Returns the render, or else the token of the lock this worker took
+        instead, because the other render released it without a result or
+        because it expired.
+        """
+        while True:
+            data = shared.get(key)
+            if data is None and (token := shared.claim(key)) is not None:
+                # The render may have landed between the lookup and the claim.
+                data = shared.get(key)
+                if data is None:
+                    return None, token
+                shared.release(key, token)
+            if data is not None:
+                self.memory.put(key, data)
+                return data, None
+            time.sleep(RENDER_LOCK_POLL_INTERVAL)
+
+    def get_or_render(self, key: str, render: Callable[[], bytes]) -> bytes:
+        """Returns the cached render for `key`, rendering it on a miss.
+
+        With a shared tier, concurrent misses for the same key across workers
+        are deduplicated: one worker renders while the rest wait for it.
+        """
+        data = self.get(key)
+        if data is not None:
+            return data
+        token = None
+        if self.shared is not None:
+            token = self.shared.claim(key)
+            if token is None:
+                logger.debug(f"Waiting for in-flight render: {key}")
+                data, token = self._wait_for_shared(self.shared, key)
+            elif (data := self.shared.get(key)) is not None:
+                # Another worker finished the render since the lookup above.
+                self.shared.release(key, token)
+                self.memory.put(key, data)
+            if data is not None:
+                return data
+
+        logger.debug(f"Render cache miss: {key}")
+        try:
+            data = render()
+            self.put(key, data)
+        finally:
+            if self.shared is not None and token is not None:
+                self.shared.release(key, token)
+        return data
+
+    def store_stream(self, key: str, chunks: Iterator[bytes]) -> Iterator[bytes]:
+        """Passes `chunks` through, caching the joined result once complete."""
+        parts = []
+        for chunk in chunks:
+            parts.append(chunk)
+            yield chunk
+        self.put(key, b"".join(parts))
+
+
+render_cache = RenderCache(
+    MemoryCache(RENDER_CACHE_MEMORY_BYTES),
+    DiskCache(RENDER_CACHE_DIR, RENDER_CACHE_DISK_BYTES),
+    SharedCache(store) if store is not None else None,
+)
+
+
+def render_map_cached(
+    size: int,
+    octaves: int,
+    seed: int | None = None,
+    island_density: float = 0.0,
+    cache: RenderCache = render_cache,
+) -> bytes:
+    """Renders a map PNG, reusing a cached copy when the seed is fixed.
+
+    Maps without a seed are random, so they are never looked up or stored.
+    """
+
+    def render() -> bytes:
+        buf = render_map_to_buffer(
+            size, octaves, seed=seed, island_density=island_density
+        )
+        return buf.getvalue()
+
+    if seed is None:
+        return render()
+    return cache.get_or_render(cache_key(size, octaves, seed, island_density), render)
+
+
+def render_map_images_cached(
+    size: int,
+    octaves: int,
+    seed: int,
+    island_density: float = 0.0,
+    cache: RenderCache = render_cache,
+) -> MapImages:
+    """Renders a seeded map's PNG and mipmaps, reusing cached copies.
+
+    The full image is cached under the same key as `render_map_cached` and
+    each mipmap level next to it, so a map created again is served from the
+    cache without generating its heightmap.
+    """
+    rendered: list[MapImages] = []
+
+    def render() -> bytes:
+        heightmap = generate_heightmap(size, octaves, seed, island_density)
+        images = encode_map_images(heightmap)
+        for level, png in images.mipmaps:
+            cache.put(cache_key(size, octaves, seed, island_density, mip=level), png)
+        rendered.append(images)
+        return images.png
+
+    png = cache.get_or_render(cache_key(size, octaves, seed, island_density), render)
+    if rendered:
+        return rendered[-1]
+    mipmaps = []
+    for level in mip_sizes(size):
+        data = cache.get(cache_key(size, octaves, seed, island_density, mip=level))
+        if data is None:
+            # The level was evicted without the full image; render both again.
+            render()
+            return rendered[-1]
+        mipmaps.append((level, data))
+    return MapImages(png, mipmaps)
+
+
+def render_tile_cached(
+    size: int,
+    octaves: int,
+    seed: int,
+    island_density: float,
+    z: int,
+    x: int,
+    y: int,
+    cache: RenderCache = render_cache,
+) -> bytes:
+    """Renders one tile PNG of a map, reusing a cached copy when available."""
+    return cache.get_or_render(
+        tile_cache_key(size, octaves, seed, island_density, z, x, y),
+        lambda: render_tile_png(size, octaves, seed, island_density, z, x, y),
+    )
@@ -0,0 +1,566 @@
+import io
+import random
+import struct
+import threading
+import zlib
+from collections.abc import Iterator, Sequence
+from functools import lru_cache
+from itertools import batched
+from typing import NamedTuple
+
+import numpy as np
+import numpy.typing as npt
+
+from magrathea.maps.palettes import SEA_SAND_GRASS_LUT, apply_lut
+from magrathea.metrics import timed
+
+# Bump whenever a change alters the output rendered for the same parameters.
+ENGINE_VERSION = "1"
+
+# Number of noise periods spanned by the full map at the first octave.
+BASE_FREQUENCY = 4.0
+# Amplitude and frequency multipliers applied between successive octaves.
+PERSISTENCE = 0.5
+LACUNARITY = 2.0
+# Maps at least this wide use every core unless `workers` says otherwise.
+PARALLEL_MIN_SIZE = 1024
+# Precision raw heightmaps are stored at.
+HEIGHTMAP_DTYPE = np.float32
+# Smallest mipmap level kept for each stored map.
+MIPMAP_MIN_SIZE = 32
+# Pixels across all maps of a batch held in memory at once (128 MiB).
+BATCH_MAX_PIXELS = 1 << 24
+# Rows generated and encoded at a time when streaming a PNG.
+STREAM_BAND_ROWS = 256
+PNG_COMPRESSION_LEVEL = 6
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+PNG_FILTER_UP = 2
+# Edge length in pixels of the square tiles served for slippy maps.
+TILE_SIZE = 256
+# Map size rendered by `warm_up`; any size loads the same kernels.
+WARM_UP_SIZE = 8
+# Map sizes whose coordinate axes are kept, and the largest map whose whole
+# falloff mask is kept (32 MiB); bigger masks are built band by band.
+MASK_CACHE_ENTRIES = 8
+MASK_CACHE_MAX_SIZE = 2048
+
+# Numba's default threading layer aborts the process when two threads run
+# parallel kernels at once, so only one parallel call runs at a time.
+_parallel_lock = threading.Lock()
+
+
+def _read_only[T: np.ndarray](array: T) -> T:
+    array.setflags(write=False)
+    return array
+
+
+@lru_cache(maxsize=MASK_CACHE_ENTRIES)
+def map_coordinates(size: int) -> npt.NDArray[np.float64]:
+    """Noise-space coordinates of each pixel along one axis of a `size` map.
+
+    Cached per size and read-only, since every map of that size shares them.
+    """
+    return _read_only(np.arange(size, dtype=np.float64) * (BASE_FREQUENCY / size))
+
+
+@lru_cache(maxsize=MASK_CACHE_ENTRIES)
+def _falloff_axis_sq(size: int) -> npt.NDArray[np.float64]:
+    """Squared distance from the centre, in [-1, 1] units, along one axis."""
+    return _read_only(np.linspace(-1.0, 1.0, size) ** 2)
+
+
+@lru_cache(maxsize=MASK_CACHE_ENTRIES)
+def _full_island_mask(size: int) -> npt.NDArray[np.float64]:
+    return _read_only(_island_mask_rows(size, 0, size))
+
+
+def _island_mask_rows(size: int, start: int, stop: int) -> npt.NDArray[np.float64]:
+    axis_sq = _falloff_axis_sq(size)
+    distance_sq = axis_sq[np.newaxis, :] + axis_sq[start:stop, np.newaxis]
+    return np.clip(1.0 - distance_sq, 0.0, 1.0)
+
+
+def octave_noise(
+    x: npt.NDArray[np.float64],
+    y: npt.NDArray[np.float64],
+    octaves: int,
+    seed: int,
+    workers: int = 1,
+) -> npt.NDArray[np.float64]:
+    """Fractal noise over the grid `y` x `x`, scaled to [-1, 1].
+
+    The whole grid is filled by a single compiled kernel call, so no per-pixel
+    work happens in Python. With `workers` > 1 the grid is split into row bands
+    computed on that many threads; the output is identical either way. While
+    another thread runs a parallel kernel the grid is computed serially.
+    """
+    # Numba is imported on first use rather than with this module, since it
+    # takes a large share of startup time; see `warm_up`.
+    from numba import set_num_threads
+
+    from magrathea.maps.noise import (
+        MAX_THREADS,
+        fractal_noise,
+        fractal_noise_parallel,
+        permutation_table,
+    )
+
+    out = np.empty((y.size, x.size))
+    perm = permutation_table(seed)
+    if workers > 1 and _parallel_lock.acquire(blocking=False):
+        try:
+            set_num_threads(min(workers, MAX_THREADS))
+            fractal_noise_parallel(x, y, octaves, PERSISTENCE, LACUNARITY, perm, out)
+        finally:
+            _parallel_lock.release()
+    else:
+        fractal_noise(x, y, octaves, PERSISTENCE, LACUNARITY, perm, out)
+    return out
+
+
+def octave_noise_batch(
+    x: npt.NDArray[np.float64],
+    y: npt.NDArray[np.float64],
+    octaves: int,
+    seeds: Sequence[int],
+    workers: int = 1,
+) -> npt.NDArray[np.float64]:
+    """`octave_noise` for every seed in `seeds`, stacked on the first axis."""
+    from numba import set_num_threads
+
+    from magrathea.maps.noise import (
+        MAX_THREADS,
+        fractal_noise_batch,
+        fractal_noise_batch_parallel,
+        permutation_table,
+    )
+
+    out = np.empty((len(seeds), y.size, x.size))
+    perms = np.stack([permutation_table(seed) for seed in seeds])
+    if workers > 1 and _parallel_lock.acquire(blocking=False):
+        try:
+            set_num_threads(min(workers, MAX_THREADS))
+            fractal_noise_batch_parallel(
+                x, y, octaves, PERSISTENCE, LACUNARITY, perms, out
+            )
+        finally:
+            _parallel_lock.release()
+    else:
+        fractal_noise_batch(x, y, octaves, PERSISTENCE, LACUNARITY, perms, out)
+    return out
+
+
+def island_mask(
+    size: int, start: int = 0, stop: int | None = None
+) -> npt.NDArray[np.float64]:
+    """Radial falloff that is 1 at the centre of the map and 0 at its edges.
+
+    `start` and `stop` select a band of rows. The mask depends only on `size`,
+    so masks up to `MASK_CACHE_MAX_SIZE` are computed once and every map of
+    that size gets a read-only view of the same array; larger maps build just
+    the requested band and never the full `size` x `size` mask.
+    """
+    if size <= MASK_CACHE_MAX_SIZE:
+        return _full_island_mask(size)[start:stop]
+    return _island_mask_rows(size, start, size if stop is None else stop)
+
+
+def max_zoom(size: int) -> int:
+    """Deepest zoom level of a `size` map's tile pyramid, at one pixel per pixel."""
+    zoom = 0
+    while TILE_SIZE << zoom < size:
+        zoom += 1
+    return zoom
+
+
+def heightmap_window(
+    size: int,
+    octaves: int,
+    seed: int,
+    island_density: float,
+    px: npt.NDArray[np.float64],
+    py: npt.NDArray[np.float64],
+    workers: int = 1,
+) -> npt.NDArray[np.float64]:
+    """Heightmap of a `size` map sampled at pixel positions `py` x `px`.
+
+    Positions may be fractional or lie outside the map, which is sea. Sampling
+    integer positions gives exactly the values `generate_heightmap` computes
+    for those pixels, so windows cut from the same map line up seamlessly.
+    """
+    scale = BASE_FREQUENCY / size
+    with timed("noise"):
+        heightmap = octave_noise(px * scale, py * scale, octaves, seed, workers)
+    with timed("mask"):
+        # The same falloff as `island_mask`, evaluated at arbitrary positions.
+        step = 2.0 / (size - 1) if size > 1 else 0.0
+        ax = px * step - 1.0
+        ay = py * step - 1.0
+        mask = np.clip(1.0 - (ax[np.newaxis, :] ** 2 + ay[:, np.newaxis] ** 2), 0, 1)
+    with timed("normalize"):
+        heightmap += 1.0
+        heightmap *= 0.5
+        heightmap += island_density
+        heightmap *= mask
+        np.clip(heightmap, 0.0, 1.0, out=heightmap)
+    return heightmap
+
+
+def tile_heightmap(
+    size: int,
+    octaves: int,
+    seed: int,
+    island_density: float,
+    z: int,
+    x: int,
+    y: int,
+) -> npt.NDArray[np.float64]:
+    """Heightmap of tile `x`, `y` at zoom `z` of a `size` map's tile pyramid.
+
+    At `max_zoom` tile pixels are map pixels, and each level above halves the
+    resolution, until zoom 0 fits the whole map in one tile. Maps whose size is
+    not a power-of-two multiple of `TILE_SIZE` sit in the top-left corner of
+    the pyramid, padded with sea. Noise is only computed for the tile's own
+    window, so the cost of a tile does not depend on the size of the map.
+    """
+    pixels_per_tile_pixel = float(1 << (max_zoom(size) - z))
+    offsets = np.arange(TILE_SIZE, dtype=np.float64)
+    px = (x * TILE_SIZE + offsets) * pixels_per_tile_pixel
+    py = (y * TILE_SIZE + offsets) * pixels_per_tile_pixel
+    return heightmap_window(size, octaves, seed, island_density, px, py)
+
+
+def default_workers(size: int, count: int = 1) -> int:
+    """Threads to use for `count` maps of `size` when the caller doesn't choose."""
+    from magrathea.maps.noise import MAX_THREADS
+
+    return MAX_THREADS if count * size * size >= PARALLEL_MIN_SIZE**2 else 1
+
+
+def warm_up() -> None:
+    """Imports Numba and loads every noise kernel a render may call.
+
+    Kernels are compiled with `cache=True`, so this only reads them from
+    Numba's on-disk cache unless the source changed. Called at startup, before
+    the app accepts requests, it keeps that cost off the first request.
+    """
+    from magrathea.maps.noise import MAX_THREADS
+
+    coords = map_coordinates(WARM_UP_SIZE)
+    for workers in sorted({1, MAX_THREADS}):
+        octave_noise(coords, coords, 1, 0, workers)
+        octave_noise_batch(coords, coords, 1, [0], workers)
+
+
+def heightmap_rows(
+    size: int,
+    octaves: int,
+    seed: int,
+    island_density: float,
+    start: int,
+    stop: int,
+    workers: int = 1,
+) -> npt.NDArray[np.float64]:
+    """Rows `start` to `stop` of the heightmap `generate_heightmap` would build.
+
+    Every pixel depends only on its own coordinates, so bands computed
+    separately are identical to the corresponding rows of the full map.
+    """
+    coords = map_coordinates(size)
+    with timed("noise"):
+        heightmap = octave_noise(coords, coords[start:stop], octaves, seed, workers)
+    with timed("mask"):
+        mask = island_mask(size, start, stop)
+    with timed("normalize"):
+        # Scale noise from [-1, 1] to [0, 1] before shifting and masking it.
+        heightmap += 1.0
+        heightmap *= 0.5
+        heightmap += island_density
+        heightmap *= mask
+        np.clip(heightmap, 0.0, 1.0, out=heightmap)
+    return heightmap
+
+
+def generate_heightmap(
+    size: int,
+    octaves: int,
+    seed: int | None = None,
+    island_density: float = 0.0,
+    workers: int | None = None,
+) -> npt.NDArray[np.float64]:
+    """Generates a `size` x `size` island heightmap with values in [0, 1].
+
+    `island_density` shifts elevation before the island mask is applied, so
+    positive values raise more land above sea level and negative values sink it.
+    `workers` caps the threads used for noise; by default maps of at least
+    `PARALLEL_MIN_SIZE` use every core and smaller ones stay single-threaded.
+    """
+    if seed is None:
+        seed = random.randint(0, 1000000)
+    if workers is None:
+        workers = default_workers(size)
+    return heightmap_rows(size, octaves, seed, island_density, 0, size, workers)
+
+
+def generate_heightmaps(
+    size: int,
+    octaves: int,
+    seeds: Sequence[int],
+    island_density: float = 0.0,
+    workers: int | None = None,
+) -> npt.NDArray[np.float64]:
+    """Generates one heightmap per seed as a `(len(seeds), size, size)` array.
+
+    All maps come from a single kernel call sharing one coordinate grid and
+    falloff mask, and `out[k]` is identical to `generate_heightmap` with
+    `seeds[k]`. The whole stack is held in memory; see `iter_map_images` for
+    batches too large for that.
+    """
+    if workers is None:
+        workers = default_workers(size, len(seeds))
+    coords = map_coordinates(size)
+    with timed("noise"):
+        heightmaps = octave_noise_batch(coords, coords, octaves, seeds, workers)
+    with timed("mask"):
+        mask = island_mask(size)
+    with timed("normalize"):
+        heightmaps += 1.0
+        heightmaps *= 0.5
+        heightmaps += island_density
+        heightmaps *= mask
+        np.clip(heightmaps, 0.0, 1.0, out=heightmaps)
+    return heightmaps
+
+
+def downsample(heightmap: npt.NDArray[np.float64]) -> npt.NDArray[np.float64]:
+    """Halves a heightmap by averaging each 2 x 2 block of elevations.
+
+    An odd last row or column is dropped rather than averaged with padding.
+    """
+    half = len(heightmap) // 2
+    blocks = heightmap[: half * 2, : half * 2].reshape(half, 2, half, 2)
+    return blocks.mean(axis=(1, 3))
+
+
+def mip_levels(
+    heightmap: npt.NDArray[np.float64], min_size: int = MIPMAP_MIN_SIZE
+) -> Iterator[npt.NDArray[np.float64]]:
+    """Successively halved copies of `heightmap`, down to `min_size` pixels.
+
+    Each level is reduced from the one before it, so the whole chain costs
+    about a third of one pass over the full map.
+    """
+    level = heightmap
+    while len(level) // 2 >= min_size:
+        level = downsample(level)
+        yield level
+
+
+def mip_sizes(size: int, min_size: int = MIPMAP_MIN_SIZE) -> list[int]:
+    """Sizes of the levels `mip_levels` yields for a `size` map."""
+    sizes = []
+    while size // 2 >= min_size:
+        size //= 2
+        sizes.append(size)
+    return sizes
+
+
+def mip_size(size: int, max_px: int, min_size: int = MIPMAP_MIN_SIZE) -> int:
+    """Size of the largest mipmap level of a `size` map no wider than `max_px`.
+
+    That is `size` itself when it fits, and the smallest level otherwise.
+    """
+    while size > max_px and size // 2 >= min_size:
+        size //= 2
+    return size
+
+
+def colorize(
+    heightmap: npt.NDArray[np.float64],
+    lut: npt.NDArray[np.uint8] = SEA_SAND_GRASS_LUT,
+) -> npt.NDArray[np.uint8]:
+    """Maps elevations to RGB colours, by default with the sea/sand/grass palette."""
+    with timed("colorize"):
+        return apply_lut(heightmap, lut)
+
+
+def _png_chunk(chunk_type: bytes, data: bytes) -> bytes:
+    crc = zlib.crc32(data, zlib.crc32(chunk_type))
+    return struct.pack(">I", len(data)) + chunk_type + data + struct.pack(">I", crc)
+
+
+def iter_png(
+    width: int,
+    height: int,
+    bands: Iterator[npt.NDArray[np.uint8]],
+    level: int = PNG_COMPRESSION_LEVEL,
+    palette: npt.NDArray[np.uint8] | None = None,
+) -> Iterator[bytes]:
+    """Encodes row bands totalling `height` rows of `width` as a PNG.
+
+    Bands hold RGB pixels, or with a `palette` of up to 256 RGB entries, one
+    palette index per pixel. Each band is filtered and fed to the deflate
+    stream at zlib `level` before the next one is requested, so a lazy
+    `bands` iterator keeps peak memory at one band.
+    """
+    # 8-bit truecolour or palette colour, no interlacing.
+    colour_type, channels = (2, 3) if palette is None else (3, 1)
+    header = struct.pack(">IIBBBBB", width, height, 8, colour_type, 0, 0, 0)
+    yield PNG_SIGNATURE + _png_chunk(b"IHDR", header)
+    if palette is not None:
+        yield _png_chunk(b"PLTE", palette.tobytes())
+
+    row_bytes = width * channels
+    compressor = zlib.compressobj(level)
+    previous = np.zeros(row_bytes, dtype=np.uint8)
+    for band in bands:
+        with timed("encode"):
+            rows = band.reshape(-1, row_bytes)
+
+            # The "Up" filter stores each row as its difference from the row
+            # above, which turns flat colour regions into runs of zeros.
+            scanlines = np.empty((rows.shape[0], row_bytes + 1), dtype=np.uint8)
+            scanlines[:, 0] = PNG_FILTER_UP
+            scanlines[0, 1:] = rows[0] - previous
+            scanlines[1:, 1:] = rows[1:] - rows[:-1]
+            previous = rows[-1].copy()
+
+            data = compressor.compress(scanlines.tobytes())
+        if data:
+            yield _png_chunk(b"IDAT", data)
+
+    with timed("encode"):
+        data = compressor.flush()
+    yield _png_chunk(b"IDAT", data)
+    yield _png_chunk(b"IEND", b"")
+
+
+def iter_map_png(
+    size: int,
+    octaves: int,
+    seed: int | None = None,
+    island_density: float = 0.0,
+    band_rows: int = STREAM_BAND_ROWS,
+    workers: int | None = None,
+) -> Iterator[bytes]:
+    """Generates a map as a PNG, yielding encoded chunks band by band.
+
+    Each band of `band_rows` rows is generated, coloured and encoded before
+    the next one is started, so peak memory grows with the band rather than
+    the whole map and the first bytes are available long before the last rows
+    are computed.
+    """
+    if seed is None:
+        seed = random.randint(0, 1000000)
+    if workers is None:
+        workers = default_workers(size)
+
+    def bands() -> Iterator[npt.NDArray[np.uint8]]:
+        for start in range(0, size, band_rows):
+            stop = min(start + band_rows, size)
+            yield colorize(
+                heightmap_rows(
+                    size, octaves, seed, island_density, start, stop, workers
+                )
+            )
+
+    yield from iter_png(size, size, bands())
+
+
+def iter_heightmap_png(
+    heightmap: npt.NDArray[np.float64],
+    band_rows: int = STREAM_BAND_ROWS,
+    level: int = PNG_COMPRESSION_LEVEL,
+) -> Iterator[bytes]:
+    """Encodes an already generated square heightmap as a PNG, band by band."""
+    size = len(heightmap)
+    bands = (
+        colorize(heightmap[start : start + band_rows])
+        for start in range(0, size, band_rows)
+    )
+    return iter_png(size, size, bands, level)
+
+
+class MapImages(NamedTuple):
+    png: bytes
+    # (size, png) of each mipmap level, largest first.
+    mipmaps: list[tuple[int, bytes]]
+
+
+def encode_map_images(heightmap: npt.NDArray[np.float64]) -> MapImages:
+    """Encodes a heightmap as a full-size PNG plus PNGs of its mipmap levels."""
+    return MapImages(
+        png=b"".join(iter_heightmap_png(heightmap)),
+        mipmaps=[
+            (len(level), b"".join(iter_heightmap_png(level)))
+            for level in mip_levels(heightmap)
+        ],
+    )
+
+
+def iter_map_images(
+    size: int,
+    octaves: int,
+    seeds: Sequence[int],
+    island_density: float = 0.0,
+    workers: int | None = None,
+    max_pixels: int = BATCH_MAX_PIXELS,
+) -> Iterator[MapImages]:
+    """Renders the images of one map per seed, generating heightmaps in batches.
+
+    Each batch holds as many maps as fit in `max_pixels`, so large requests
+    keep the per-call savings of `generate_heightmaps` with bounded memory.
+    """
+    per_batch = max(1, max_pixels // (size * size))
+    for seed_batch in batched(seeds, per_batch, strict=False):
+        heightmaps = generate_heightmaps(
+            size, octaves, seed_batch, island_density, workers
+        )
+        for heightmap in heightmaps:
+            yield encode_map_images(heightmap)
+
+
+def render_tile_png(
+    size: int,
+    octaves: int,
+    seed: int,
+    island_density: float,
+    z: int,
+    x: int,
+    y: int,
+) -> bytes:
+    """Renders one `TILE_SIZE` tile of a map's tile pyramid as a PNG."""
+    heightmap = tile_heightmap(size, octaves, seed, island_density, z, x, y)
+    return b"".join(iter_png(TILE_SIZE, TILE_SIZE, iter([colorize(heightmap)])))
+
+
+def render_map_to_buffer(
+    size: int,
+    octaves: int,
+    seed: int | None = None,
+    island_density: float = 0.0,
+    workers: int | None = None,
+) -> io.BytesIO:
+    """Generates a map and returns it as a PNG in an in-memory buffer."""
+    buf = io.BytesIO()
+    for chunk in iter_map_png(
+        size, octaves, seed=seed, island_density=island_density, workers=workers
+    ):
+        buf.write(chunk)
+    buf.seek(0)
+    return buf
+
+
+def render_map_to_png(
+    size: int,
+    octaves: int,
+    filename: str,
+    seed: int | None = None,
+    island_density: float = 0.0,
+) -> None:
+    """Generates a map and writes it to `filename` as a PNG."""
+    with open(filename, "wb") as f:
+        for chunk in iter_map_png(
+            size, octaves, seed=seed, island_density=island_density
+        ):
+            f.write(chunk)
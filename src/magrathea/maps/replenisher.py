@@ -0,0 +1,304 @@
+import argparse
+import multiprocessing
+import os
+import random
+import secrets
+import threading
+import uuid
+from collections.abc import Callable, Sequence
+from concurrent.futures import Executor, ProcessPoolExecutor
+from itertools import batched
+from typing import NamedTuple
+
+from loguru import logger
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from magrathea.database import SessionLocal
+from magrathea.maps.blob_store import BlobStore, blob_store
+from magrathea.maps.map import Map, store_levels
+from magrathea.maps.rendering_engine import MapImages, iter_map_images
+from magrathea.metrics import timed
+from magrathea.redis_store import (
+    KeyValueStore,
+    delete_if_held,
+    renew_if_held,
+    store,
+)
+
+POOL_BUCKETS = os.environ.get("MAGRATHEA_POOL_BUCKETS", "128:4:0.0:10")
+POOL_REPLENISH = os.environ.get("MAGRATHEA_POOL_REPLENISH", "0") == "1"
+POOL_PROCESSES = int(os.environ.get("MAGRATHEA_POOL_PROCESSES", os.cpu_count() or 1))
+POOL_CHECK_INTERVAL = float(os.environ.get("MAGRATHEA_POOL_CHECK_INTERVAL", 10))
+# Maps rendered in one batched call and inserted in one transaction.
+POOL_BATCH_SIZE = 16
+# Only the replenisher holding this lease in the shared store refills the
+# pools, so that web workers running one each don't all render every shortfall.
+POOL_LEASE_KEY = "magrathea:pool:replenisher"
+# Seconds the lease outlives its last renewal, e.g. after its holder crashed.
+POOL_LEASE_SECONDS = 300
+
+
+class PoolBucket(NamedTuple):
+    size: int
+    octaves: int
+    island_density: float
+    target: int
+
+
+def parse_buckets(spec: str) -> list[PoolBucket]:
+    """Parses `size:octaves:island_density:target` entries separated by commas."""
+    buckets = []
+    for entry in spec.split(","):
+        if not entry.strip():
+            continue
+        size, octaves, island_density, target = entry.strip().split(":")
+        buckets.append(
+            PoolBucket(int(size), int(octaves), float(island_density), int(target))
+        )
+    return buckets
+
+
+def pool_level(db: Session, bucket: PoolBucket) -> int:
+    """Number of unclaimed pre-generated maps matching `bucket`."""
+    return (
+        db.scalar(
+            select(func.count())
+            .select_from(Map)
+            .where(
+                Map.is_pregenerated.is_(True),
+                Map.size == bucket.size,
+                Map.octaves == bucket.octaves,
+                Map.island_density == bucket.island_density,
+            )
+        )
+        or 0
+    )
+
+
+def render_pool_batch(bucket: PoolBucket, seeds: Sequence[int]) -> list[MapImages]:
+    """Renders a batch of pool maps. Runs in worker processes, one thread each."""
+    return list(
+        iter_map_images(
+            bucket.size, bucket.octaves, seeds, bucket.island_density, workers=1
+        )
+    )
+
+
+def create_executor(processes: int = POOL_PROCESSES) -> ProcessPoolExecutor:
+    # Spawned rather than forked workers: forking a process that has already
+    # started Numba's threading layer is not safe.
+    return ProcessPoolExecutor(
+        max_workers=processes, mp_context=multiprocessing.get_context("spawn")
+    )
+
+
+def generate_pool_maps(
+    db: Session,
+    blobs: BlobStore,
+    executor: Executor,
+    bucket: PoolBucket,
+    count: int,
+    batch_size: int = POOL_BATCH_SIZE,
+    proceed: Callable[[], bool] = lambda: True,
+) -> int:
+    """Renders `count` maps for `bucket` on `executor` and adds them to the pool.
+
+    Seeds are rendered in batches of `batch_size` with one batched kernel call
+    each, and every batch is inserted in one transaction as soon as it is
+    done, so a partial refill is still usable if the process stops midway.
+    `proceed` is called before each batch is inserted, and the refill stops
+    without inserting it when that returns False.
+    """
+    seeds = [random.randint(0, 1000000) for _ in range(count)]
+    seed_batches = list(batched(seeds, batch_size, strict=False))
+    rendered = executor.map(
+        render_pool_batch, [bucket] * len(seed_batches), seed_batches
+    )
+    added = 0
+    for seed_batch, images in zip(seed_batches, rendered, strict=True):
+        if not proceed():
+            # Batches not yet rendered are cancelled once `rendered` is dropped.
+            break
+        for seed, map_images in zip(seed_batch, images, strict=True):
+            blob = blobs.put(map_images.png)
+            db.add(
+                Map(
+                    id=str(uuid.uuid4()),
+                    size=bucket.size,
+                    octaves=bucket.octaves,
+                    seed=seed,
+                    island_density=bucket.island_density,
+                    blob_key=blob.key,
+                    byte_size=blob.byte_size,
+                    content_hash=blob.content_hash,
+                    is_pregenerated=True,
+                    levels=store_levels(blobs, map_images.mipmaps),
+                )
+            )
+        with timed("db_write"):
+            db.commit()
+        added += len(seed_batch)
+    return added
+
+
+class PoolReplenisher:
+    """Keeps each pre-generated pool bucket topped up to its target level.
+
+    Every `interval` seconds the level of each bucket is checked and any
+    shortfall is rendered on a process pool, so requests that drain a bucket
+    are followed by an automatic refill without blocking the request path.
+    With a shared `store`, replenishers in several processes take turns
+    through a lease and only its holder refills; without one, nothing is
+    coordinated and a single replenisher must run.
+    """
+
+    def __init__(
+        self,
+        buckets: list[PoolBucket],
+        session_factory: Callable[[], Session] = SessionLocal,
+        blobs: BlobStore = blob_store,
+        executor: Executor | None = None,
+        interval: float = POOL_CHECK_INTERVAL,
+        batch_size: int = POOL_BATCH_SIZE,
+        store: KeyValueStore | None = store,
+        lease_seconds: int = POOL_LEASE_SECONDS,
+    ) -> None:
+        self.buckets = buckets
+        self.session_factory = session_factory
+        self.blobs = blobs
+        self.interval = interval
+        self.batch_size = batch_size
+        self.store = store
+        self.lease_seconds = lease_seconds
+        self._token = secrets.token_hex(16)
+        self._executor = executor
+        self._owns_executor = executor is None
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            self._executor = create_executor()
+        return self._executor
+
+    def hold_lease(self) -> bool:
+        """Takes or renews the lease on refilling; False if another holds it."""
+        if self.store is None:
+            return True
+        if self.store.set(POOL_LEASE_KEY, self._token, ex=self.lease_seconds, nx=True):
+            return True
+        return renew_if_held(
+            self.store, POOL_LEASE_KEY, self._token, self.lease_seconds
+        )
+
+    def release_lease(self) -> None:
+        """Hands the lease over at once, if this replenisher holds it."""
+        if self.store is not None:
+            delete_if_held(self.store, POOL_LEASE_KEY, self._token)
+
+    def run_once(self) -> int:
+        """Refills every bucket to its target; returns the number of maps added.
+
+        The lease is renewed before every batch is inserted. A refill that lost
+        it, e.g. by outlasting `lease_seconds`, stops and leaves the remaining
+        shortfall to the new holder.
+        """
+        added = 0
+        if not self.hold_lease():
+            return added
+        with self.session_factory() as db:
+            for bucket in self.buckets:
+                if not self.hold_lease():
+                    break
+                deficit = bucket.target - pool_level(db, bucket)
+                if deficit <= 0:
+                    continue
+                logger.info(f"Refilling pool {bucket} with {deficit} maps")
+                added += generate_pool_maps(
+                    db,
+                    self.blobs,
+                    self.executor,
+                    bucket,
+                    deficit,
+                    self.batch_size,
+                    self.hold_lease,
+                )
+        return added
+
+    def run(self) -> None:
+        """Refills the pool every `interval` seconds until `stop` is called."""
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"Pool replenishment failed: {e}")
+            self._stop.wait(self.interval)
+
+    def start(self) -> None:
+        """Runs the replenisher on a background thread."""
+        if self.store is None:
+            logger.warning(
+                "Refilling the pools without MAGRATHEA_REDIS_URL to coordinate "
+                "through; with several web workers, run `pool-replenisher` instead"
+            )
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self.run, name="pool-replenisher", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.release_lease()
+        if self._owns_executor and self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+
+
+def cli() -> None:
+    parser = argparse.ArgumentParser(
+        description="Keep the pre-generated map pool topped up."
+    )
+    parser.add_argument(
+        "--buckets",
+        default=POOL_BUCKETS,
+        help="Comma-separated size:octaves:island_density:target entries",
+    )
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=POOL_CHECK_INTERVAL,
+        help="Seconds between pool level checks",
+    )
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=POOL_PROCESSES,
+        help="Number of render processes",
+    )
+    parser.add_argument(
+        "--once", action="store_true", help="Refill once and exit instead of looping"
+    )
+    args = parser.parse_args()
+
+    replenisher = PoolReplenisher(
+        parse_buckets(args.buckets),
+        executor=create_executor(args.processes),
+        interval=args.interval,
+    )
+    try:
+        if args.once:
+            added = replenisher.run_once()
+            logger.info(f"Added {added} maps to the pool")
+        else:
+            replenisher.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        replenisher.release_lease()
+        replenisher.executor.shutdown(cancel_futures=True)
@@ -1,39 +1,32 @@
 import argparse
-import random
-import uuid
 
 from magrathea.database import SessionLocal
-from magrathea.maps.map import Map
-from magrathea.maps.rendering_engine import render_map_to_buffer
+from magrathea.maps.blob_store import blob_store
+from magrathea.maps.replenisher import (
+    POOL_BATCH_SIZE,
+    PoolBucket,
+    create_executor,
+    generate_pool_maps,
+)
 
 
 def seed_maps(
-    count: int = 5, size: int = 128, octaves: int = 4, island_density: float = 0.0
+    count: int = 5,
+    size: int = 128,
+    octaves: int = 4,
+    island_density: float = 0.0,
+    batch_size: int = POOL_BATCH_SIZE,
 ) -> None:
+    """Adds `count` maps to the pool once; see `pool-replenisher` to keep it full."""
     db = SessionLocal()
     try:
         print(f"Pre-generating {count} maps...")
-        for i in range(count):
-            seed = random.randint(0, 1000000)
-            print(f"  [{i + 1}/{count}] Generating with seed {seed}...")
-
-            buf = render_map_to_buffer(
-                size, octaves, seed=seed, island_density=island_density
-            )
-
-            map_id = str(uuid.uuid4())
-            new_map = Map(
-                id=map_id,
-                size=size,
-                octaves=octaves,
-                seed=seed,
-                island_density=island_density,
-                data=buf.getvalue(),
-                is_pregenerated=True,
+        bucket = PoolBucket(size, octaves, island_density, target=count)
+        with create_executor() as executor:
+            added = generate_pool_maps(
+                db, blob_store, executor, bucket, count, batch_size
             )
-            db.add(new_map)
-        db.commit()
-        print(f"Successfully added {count} maps to the pool.")
+        print(f"Successfully added {added} maps to the pool.")
     except Exception as e:
         print(f"Error seeding database: {e}")
     finally:
@@ -55,6 +48,12 @@ def cli() -> None:
         default=0.0,
         help="Island density adjustment (float)",
     )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=POOL_BATCH_SIZE,
+        help="Maps rendered together and inserted per transaction",
+    )
 
     args = parser.parse_args()
 
@@ -63,4 +62,5 @@ def cli() -> None:
         size=args.size,
         octaves=args.octaves,
         island_density=args.island_density,
+        batch_size=args.batch_size,
     )
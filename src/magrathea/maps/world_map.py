@@ -1,45 +1,278 @@
-BIOMES = {
-    (1, 1, 1): "Ocean",
-    (4, 4, 4): "RAINFOREST",
-}
-
-
-class NoiseMap:
-    def __init__(self, seed: int) -> None:
-        self.octaves = 4
-        self.seed = seed
-
-
-class WorldMap:
-    def __init__(
-        self,
-        size: int = 256,
-        seed_height: int = 0,
-        seed_heat: int = 0,
-        seed_wet: int = 0,
-    ) -> None:
-        self.size = size
-        self.heightmap = self.generate_map(seed=seed_height)
-        self.heat_map = self.generate_map(seed=seed_heat)
-        self.wet_map = self.generate_map(seed=seed_wet)
-        self.levels: dict = {"height": [], "heat": [], "wet": []}
-
-    def generate_map(self, seed: int) -> NoiseMap:
-        return NoiseMap(seed=seed)
-
-    # # get the biome based on the internal maps
-    # def get_biome_from_point(x, y):
-
-    #     # use the noise function to generate levels at the point
-    #     # height = OpenSimplex.noise2d()
-    #     # heat = OpenSimplex.noise2d()
-    #     # wet = OpenSimplex.noise2d()
-
-    #     if height < self.levels["height"][0]:
-    #         height_level = 0
-
-    #     if heat > self.levels["heat"][1]:
-    #         heat_level = 1
-
-    #     # (height_level, heat_level, wet_level)
-    #     return BIOMES[(1, 2, 3)]
+import numpy as np
+import numpy.typing as npt
+
+from magrathea.maps.layers import LayerCache, layer_cache
+from magrathea.maps.palettes import hex_to_rgb
+from magrathea.maps.rendering_engine import (
+    BASE_FREQUENCY,
+    STREAM_BAND_ROWS,
+    default_workers,
+    heightmap_window,
+    iter_png,
+    octave_noise,
+)
+
+# Thresholds splitting each field into levels: a value below levels[0] is
+# level 0, one between levels[0] and levels[1] is level 1, and so on.
+DEFAULT_LEVELS: dict[str, list[float]] = {
+    "height": [0.35, 0.45, 0.75],  # ocean, beach, land, mountain
+    "heat": [0.35, 0.65],  # cold, temperate, hot
+    "wet": [0.35, 0.65],  # dry, moderate, wet
+}
+
+# Biome ids are indices into this tuple.
+BIOME_NAMES = (
+    "Ocean",
+    "Beach",
+    "Tundra",
+    "Taiga",
+    "Grassland",
+    "Temperate Forest",
+    "Temperate Rainforest",
+    "Desert",
+    "Savanna",
+    "Rainforest",
+    "Mountain",
+    "Snow",
+)
+
+BIOME_COLORS = {
+    "Ocean": "#1f4fff",
+    "Beach": "#f5e663",
+    "Tundra": "#c8d3c0",
+    "Taiga": "#5b7f5a",
+    "Grassland": "#9cc85a",
+    "Temperate Forest": "#4caf50",
+    "Temperate Rainforest": "#1f7a3a",
+    "Desert": "#e8c170",
+    "Savanna": "#c5b85a",
+    "Rainforest": "#0b3d0b",
+    "Mountain": "#8a8178",
+    "Snow": "#ffffff",
+}
+# RGB colour of each biome id.
+BIOME_LUT = np.array(
+    [np.round(np.array(hex_to_rgb(BIOME_COLORS[name])) * 255) for name in BIOME_NAMES],
+    dtype=np.uint8,
+)
+
+# Biome of each (height_level, heat_level, wet_level) for DEFAULT_LEVELS.
+BIOMES: dict[tuple[int, int, int], str] = {
+    **{(0, heat, wet): "Ocean" for heat in range(3) for wet in range(3)},
+    **{(1, heat, wet): "Beach" for heat in range(3) for wet in range(3)},
+    (2, 0, 0): "Tundra",
+    (2, 0, 1): "Tundra",
+    (2, 0, 2): "Taiga",
+    (2, 1, 0): "Grassland",
+    (2, 1, 1): "Temperate Forest",
+    (2, 1, 2): "Temperate Rainforest",
+    (2, 2, 0): "Desert",
+    (2, 2, 1): "Savanna",
+    (2, 2, 2): "Rainforest",
+    **{(3, 0, wet): "Snow" for wet in range(3)},
+    **{(3, heat, wet): "Mountain" for heat in (1, 2) for wet in range(3)},
+}
+
+
+def biome_lookup(
+    biomes: dict[tuple[int, int, int], str], levels: dict[str, list[float]]
+) -> npt.NDArray[np.uint8]:
+    """Packs `biomes` into an array indexed by height, heat and wet level.
+
+    Level combinations missing from `biomes` map to biome id 0.
+    """
+    shape = tuple(len(levels[field]) + 1 for field in ("height", "heat", "wet"))
+    lookup = np.zeros(shape, dtype=np.uint8)
+    for key, name in biomes.items():
+        lookup[key] = BIOME_NAMES.index(name)
+    return lookup
+
+
+# Fields are stored quantized to uint16: a quarter of the memory of float64
+# with a resolution of 1/65535, far finer than any level threshold.
+FIELD_SCALE = np.iinfo(np.uint16).max
+
+
+def quantize(values: npt.NDArray[np.float64]) -> npt.NDArray[np.uint16]:
+    """Quantizes values in [0, 1] to uint16, reusing `values` as scratch space."""
+    values *= FIELD_SCALE
+    values += 0.5
+    return values.astype(np.uint16)
+
+
+def dequantize(values: npt.NDArray[np.uint16]) -> npt.NDArray[np.float32]:
+    """The [0, 1] float32 values of a quantized field."""
+    return values.astype(np.float32) / np.float32(FIELD_SCALE)
+
+
+class NoiseMap:
+    """One noise field of a `size` map, materialized the first time it is read.
+
+    Only the parameters are kept until `values` is accessed; `drop` frees the
+    array again, evicting it from `cache` too, and the next access recomputes
+    the identical field from its seed. Materialized fields are shared through
+    `cache`, so a world that differs from a recent one in a single seed only
+    computes that field.
+    """
+
+    __slots__ = ("_values", "cache", "island", "octaves", "seed", "size")
+
+    def __init__(
+        self,
+        seed: int,
+        size: int,
+        octaves: int = 4,
+        island: bool = False,
+        cache: LayerCache = layer_cache,
+    ) -> None:
+        self.octaves = octaves
+        self.seed = seed
+        self.size = size
+        # Island fields fall off to 0 towards the map edges, like heightmaps.
+        self.island = island
+        self.cache = cache
+        self._values: npt.NDArray[np.uint16] | None = None
+
+    def sample(
+        self,
+        px: npt.NDArray[np.float64],
+        py: npt.NDArray[np.float64],
+        workers: int = 1,
+    ) -> npt.NDArray[np.uint16]:
+        """Quantized values of the field at pixel positions `py` x `px`."""
+        if self.island:
+            values = heightmap_window(
+                self.size, self.octaves, self.seed, 0.0, px, py, workers
+            )
+        else:
+            scale = BASE_FREQUENCY / self.size
+            values = octave_noise(
+                px * scale, py * scale, self.octaves, self.seed, workers
+            )
+            values += 1.0
+            values *= 0.5
+        return quantize(values)
+
+    @property
+    def values(self) -> npt.NDArray[np.uint16]:
+        """The whole `size` x `size` field, computed on first access."""
+        if self._values is None:
+            coords = np.arange(self.size, dtype=np.float64)
+            self._values = self.cache.get_or_compute(
+                self._key,
+                lambda: self.sample(coords, coords, default_workers(self.size)),
+            )
+        return self._values
+
+    @property
+    def _key(self) -> tuple[object, ...]:
+        return ("field", self.size, self.octaves, self.seed, self.island)
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held by the materialized field, 0 if it isn't."""
+        return 0 if self._values is None else self._values.nbytes
+
+    def drop(self) -> None:
+        self._values = None
+        self.cache.discard(self._key)
+
+
+class WorldMap:
+    __slots__ = (
+        "cache",
+        "heat_map",
+        "heightmap",
+        "levels",
+        "lookup",
+        "size",
+        "wet_map",
+    )
+
+    def __init__(
+        self,
+        size: int = 256,
+        seed_height: int = 0,
+        seed_heat: int = 0,
+        seed_wet: int = 0,
+        levels: dict[str, list[float]] | None = None,
+        biomes: dict[tuple[int, int, int], str] = BIOMES,
+        cache: LayerCache = layer_cache,
+    ) -> None:
+        self.size = size
+        self.cache = cache
+        self.heightmap = self.generate_map(seed=seed_height, island=True)
+        self.heat_map = self.generate_map(seed=seed_heat)
+        self.wet_map = self.generate_map(seed=seed_wet)
+        self.levels = levels if levels is not None else DEFAULT_LEVELS
+        self.lookup = biome_lookup(biomes, self.levels)
+
+    def generate_map(self, seed: int, island: bool = False) -> NoiseMap:
+        return NoiseMap(seed=seed, size=self.size, island=island, cache=self.cache)
+
+    def classify(
+        self,
+        height: npt.NDArray[np.uint16],
+        heat: npt.NDArray[np.uint16],
+        wet: npt.NDArray[np.uint16],
+    ) -> npt.NDArray[np.uint8]:
+        """Biome ids of the given quantized field values, against `levels`.
+
+        The three levels are packed into one flat index into `lookup`, so only
+        a single integer array the size of the input is ever allocated.
+        """
+        _, heat_levels, wet_levels = self.lookup.shape
+        index = np.digitize(height, self._thresholds("height"))
+        index *= heat_levels
+        index += np.digitize(heat, self._thresholds("heat"))
+        index *= wet_levels
+        index += np.digitize(wet, self._thresholds("wet"))
+        return self.lookup.take(index)
+
+    def _thresholds(self, field: str) -> npt.NDArray[np.uint16]:
+        return quantize(np.array(self.levels[field], dtype=np.float64))
+
+    def fields(
+        self,
+    ) -> tuple[npt.NDArray[np.uint16], npt.NDArray[np.uint16], npt.NDArray[np.uint16]]:
+        """The quantized height, heat and wet fields over the whole map."""
+        return self.heightmap.values, self.heat_map.values, self.wet_map.values
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held by the fields materialized so far."""
+        return self.heightmap.nbytes + self.heat_map.nbytes + self.wet_map.nbytes
+
+    def drop(self) -> None:
+        """Frees every materialized field; they are recomputed when next read."""
+        self.heightmap.drop()
+        self.heat_map.drop()
+        self.wet_map.drop()
+
+    def biome_map(self) -> npt.NDArray[np.uint8]:
+        """`size` x `size` raster of biome ids, indices into `BIOME_NAMES`.
+
+        The fields are quantized and looked up as whole arrays, so there is no
+        per-pixel Python work however large the map is.
+        """
+        return self.classify(*self.fields())
+
+    def render_png(self, band_rows: int = STREAM_BAND_ROWS) -> bytes:
+        """The biome map coloured with `BIOME_COLORS`, as a PNG."""
+        biomes = self.biome_map()
+        bands = (
+            BIOME_LUT[biomes[start : start + band_rows]]
+            for start in range(0, self.size, band_rows)
+        )
+        return b"".join(iter_png(self.size, self.size, bands))
+
+    def get_biome_from_point(self, x: int, y: int) -> str:
+        """Name of the biome at pixel `x`, `y`, computed without the full map."""
+        px = np.array([x], dtype=np.float64)
+        py = np.array([y], dtype=np.float64)
+        biome = self.classify(
+            self.heightmap.sample(px, py),
+            self.heat_map.sample(px, py),
+            self.wet_map.sample(px, py),
+        )
+        return BIOME_NAMES[biome[0, 0]]
@@ -0,0 +1,208 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections.abc import Iterable, Iterator, Mapping
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from loguru import logger
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Adds a Server-Timing header with the stages of each request to its response.
+SERVER_TIMING = os.environ.get("MAGRATHEA_SERVER_TIMING", "0") == "1"
+
+# Upper bounds in seconds, from a band of a small map to a whole huge one.
+STAGE_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+)
+
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _header(name: str, help: str, kind: str) -> list[str]:
+    return [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+
+
+class Histogram:
+    """Cumulative histogram with one label, in the Prometheus text format."""
+
+    def __init__(
+        self, name: str, help: str, label: str, buckets: Iterable[float]
+    ) -> None:
+        self.name = name
+        self.help = help
+        self.label = label
+        self.buckets = tuple(buckets)
+        # Per label value: a count per bucket plus one for +Inf, and the sum.
+        self._counts: dict[str, list[int]] = {}
+        self._sums: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_value: str, value: float) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._counts.setdefault(label_value, [0] * (len(self.buckets) + 1))
+            counts[index] += 1
+            self._sums[label_value] = self._sums.get(label_value, 0.0) + value
+
+    def count(self, label_value: str) -> int:
+        with self._lock:
+            return sum(self._counts.get(label_value, ()))
+
+    def render(self) -> list[str]:
+        lines = _header(self.name, self.help, "histogram")
+        with self._lock:
+            for label_value, counts in sorted(self._counts.items()):
+                label = f'{self.label}="{_escape(label_value)}"'
+                total = 0
+                bounds = [*(repr(b) for b in self.buckets), "+Inf"]
+                for bound, count in zip(bounds, counts, strict=True):
+                    total += count
+                    lines.append(f'{self.name}_bucket{{{label},le="{bound}"}} {total}')
+                lines.append(f"{self.name}_sum{{{label}}} {self._sums[label_value]}")
+                lines.append(f"{self.name}_count{{{label}}} {total}")
+        return lines
+
+
+class Counter:
+    """Monotonic counter with one label, in the Prometheus text format."""
+
+    def __init__(self, name: str, help: str, label: str) -> None:
+        self.name = name
+        self.help = help
+        self.label = label
+        self._values: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, label_value: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[label_value] = self._values.get(label_value, 0.0) + amount
+
+    def value(self, label_value: str) -> float:
+        with self._lock:
+            return self._values.get(label_value, 0.0)
+
+    def render(self) -> list[str]:
+        lines = _header(self.name, self.help, "counter")
+        with self._lock:
+            for label_value, value in sorted(self._values.items()):
+                label = f'{self.label}="{_escape(label_value)}"'
+                lines.append(f"{self.name}{{{label}}} {value}")
+        return lines
+
+
+def gauge(
+    name: str, help: str, value: float | Mapping[str, float], label: str = ""
+) -> list[str]:
+    """A gauge read at scrape time: one value, or one per value of `label`."""
+    lines = _header(name, help, "gauge")
+    if isinstance(value, Mapping):
+        for label_value, v in sorted(value.items()):
+            lines.append(f'{name}{{{label}="{_escape(label_value)}"}} {v}')
+    else:
+        lines.append(f"{name} {value}")
+    return lines
+
+
+def render_metrics(families: Iterable[list[str]]) -> str:
+    return "\n".join(line for family in families for line in family) + "\n"
+
+
+stage_seconds = Histogram(
+    "magrathea_stage_seconds",
+    "Time spent in each stage of map generation and storage.",
+    "stage",
+    STAGE_BUCKETS,
+)
+cache_lookups = Counter(
+    "magrathea_render_cache_lookups_total",
+    "Render cache lookups, by whether any tier held the render.",
+    "result",
+)
+
+# Stage durations of the current request, when Server-Timing is enabled.
+_request_timings: ContextVar[dict[str, float] | None] = ContextVar(
+    "request_timings", default=None
+)
+
+
+def record(stage: str, seconds: float) -> None:
+    stage_seconds.observe(stage, seconds)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+@contextmanager
+def timed(stage: str) -> Iterator[None]:
+    """Records the time spent in the block as one observation of `stage`.
+
+    Banded renders time each band separately, so a request's stage total is
+    the sum of its observations.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - start)
+
+
+def server_timing(timings: Mapping[str, float]) -> str:
+    return ", ".join(
+        f"{stage};dur={seconds * 1000:.2f}" for stage, seconds in timings.items()
+    )
+
+
+class ServerTimingMiddleware:
+    """Reports the stages each request spent time in as a Server-Timing header.
+
+    The header is sent with the response headers, so a streamed response
+    only reports the stages finished before its first byte; the complete
+    breakdown is logged at debug level once the response has been sent.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings: dict[str, float] = {}
+        token = _request_timings.set(timings)
+        start = time.perf_counter()
+
+        async def send_with_timing(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                total = {"total": time.perf_counter() - start}
+                headers.append("Server-Timing", server_timing(timings | total))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_timings.reset(token)
+            timings["total"] = time.perf_counter() - start
+            logger.debug(f"{scope['method']} {scope['path']}: {server_timing(timings)}")
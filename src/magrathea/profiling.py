@@ -0,0 +1,220 @@
+import cProfile
+import json
+import os
+import random
+import re
+import secrets
+import threading
+import time
+import uuid
+from datetime import UTC, datetime
+from pathlib import Path
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import FileResponse
+from loguru import logger
+from pydantic import BaseModel
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Fraction of requests run under cProfile; 0 disables profiling entirely.
+PROFILE_SAMPLE_RATE = float(os.environ.get("MAGRATHEA_PROFILE_SAMPLE_RATE", 0.0))
+# Profiled requests slower than this many seconds have their profile kept.
+PROFILE_BUDGET = float(os.environ.get("MAGRATHEA_PROFILE_BUDGET", 1.0))
+PROFILE_DIR = os.environ.get("MAGRATHEA_PROFILE_DIR", "./profiles")
+# Profiles kept on disk; the oldest are deleted beyond this.
+PROFILE_KEEP = int(os.environ.get("MAGRATHEA_PROFILE_KEEP", 50))
+# The admin routes require `Authorization: Bearer <token>`, and are disabled
+# while no token is set.
+ADMIN_TOKEN = os.environ.get("MAGRATHEA_ADMIN_TOKEN")
+
+_PROFILE_ID = re.compile(r"^[0-9]{8}T[0-9]{12}-[0-9a-f]{8}$")
+
+
+class ProfileInfo(BaseModel):
+    id: str
+    method: str
+    path: str
+    query: str
+    duration: float
+    status: int | None
+    created_at: datetime
+
+
+class ProfileRing:
+    """The most recent `keep` slow-request profiles, as files under `directory`.
+
+    Each profile is a `pstats` dump (`<id>.prof`, for `python -m pstats` or
+    snakeviz) next to a JSON description of its request (`<id>.json`).
+    """
+
+    def __init__(self, directory: str | Path, keep: int) -> None:
+        self.directory = Path(directory)
+        self.keep = keep
+        self._lock = threading.Lock()
+
+    def save(self, profile: cProfile.Profile, info: ProfileInfo) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        profile.dump_stats(self.directory / f"{info.id}.prof")
+        # Written last: a profile is only listed once its description exists.
+        (self.directory / f"{info.id}.json").write_text(info.model_dump_json())
+        with self._lock:
+            self._evict()
+
+    def _evict(self) -> None:
+        descriptions = sorted(self.directory.glob("*.json"))
+        for description in descriptions[: max(len(descriptions) - self.keep, 0)]:
+            description.unlink(missing_ok=True)
+            description.with_suffix(".prof").unlink(missing_ok=True)
+
+    def list(self) -> list[ProfileInfo]:
+        """Kept profiles, newest first."""
+        if not self.directory.exists():
+            return []
+        profiles = []
+        for description in sorted(self.directory.glob("*.json"), reverse=True):
+            try:
+                profiles.append(ProfileInfo(**json.loads(description.read_text())))
+            except (OSError, ValueError):
+                # Evicted or half-written by another worker meanwhile.
+                continue
+        return profiles
+
+    def path(self, profile_id: str) -> Path | None:
+        if not _PROFILE_ID.match(profile_id):
+            return None
+        path = self.directory / f"{profile_id}.prof"
+        return path if path.exists() else None
+
+
+profile_ring = ProfileRing(PROFILE_DIR, PROFILE_KEEP)
+
+
+def new_profile_id() -> str:
+    # Sortable by time down to the microsecond, so the ring evicts and lists
+    # profiles kept within the same second in order of file name too.
+    return f"{datetime.now(UTC):%Y%m%dT%H%M%S%f}-{uuid.uuid4().hex[:8]}"
+
+
+class ProfilingMiddleware:
+    """Profiles a sampled fraction of requests and keeps the slow ones.
+
+    cProfile instruments the whole process, so only one request is profiled
+    at a time and work done concurrently for other requests shows up in its
+    profile too. Requests to the admin routes themselves are never profiled.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        sample_rate: float = PROFILE_SAMPLE_RATE,
+        budget: float = PROFILE_BUDGET,
+        ring: ProfileRing = profile_ring,
+    ) -> None:
+        self.app = app
+        self.sample_rate = sample_rate
+        self.budget = budget
+        self.ring = ring
+        self._active = threading.Lock()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if (
+            scope["type"] != "http"
+            or scope["path"].startswith("/admin/")
+            or random.random() >= self.sample_rate
+            or not self._active.acquire(blocking=False)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        status: int | None = None
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler, such as a debugger, already holds the hooks.
+            self._active.release()
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            profile.disable()
+            duration = time.perf_counter() - start
+            self._active.release()
+            if duration > self.budget:
+                self._keep(profile, scope, duration, status)
+
+    def _keep(
+        self,
+        profile: cProfile.Profile,
+        scope: Scope,
+        duration: float,
+        status: int | None,
+    ) -> None:
+        info = ProfileInfo(
+            id=new_profile_id(),
+            method=scope["method"],
+            path=scope["path"],
+            query=scope["query_string"].decode("latin-1"),
+            duration=duration,
+            status=status,
+            created_at=datetime.now(UTC),
+        )
+        try:
+            self.ring.save(profile, info)
+        except OSError as e:
+            logger.warning(f"Could not save profile of slow request: {e}")
+            return
+        logger.info(
+            f"Kept profile {info.id} of {info.method} {info.path}?{info.query} "
+            f"({duration:.2f}s over the {self.budget:.2f}s budget)"
+        )
+
+
+def get_profile_ring() -> ProfileRing:
+    return profile_ring
+
+
+def require_admin(
+    authorization: Annotated[str | None, Header()] = None,
+) -> None:
+    if not ADMIN_TOKEN:
+        raise HTTPException(
+            status_code=403, detail="Admin routes are disabled without a token"
+        )
+    if authorization is None or not secrets.compare_digest(
+        authorization, f"Bearer {ADMIN_TOKEN}"
+    ):
+        raise HTTPException(status_code=401, detail="Admin token required")
+
+
+admin_router = APIRouter(prefix="/admin", dependencies=[Depends(require_admin)])
+
+
+@admin_router.get("/profiles", response_model=list[ProfileInfo])
+def list_profiles(
+    ring: Annotated[ProfileRing, Depends(get_profile_ring)],
+) -> list[ProfileInfo]:
+    """Profiles kept of slow requests, newest first."""
+    return ring.list()
+
+
+@admin_router.get("/profiles/{profile_id}")
+def download_profile(
+    profile_id: str, ring: Annotated[ProfileRing, Depends(get_profile_ring)]
+) -> FileResponse:
+    """A kept profile as a `pstats` file, e.g. for `snakeviz <file>`."""
+    path = ring.path(profile_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="application/octet-stream", filename=path.name)
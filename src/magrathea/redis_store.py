@@ -0,0 +1,169 @@
+import os
+import threading
+import time
+from collections import deque
+from collections.abc import Sequence
+from typing import Any, Protocol, cast
+
+REDIS_URL = os.environ.get("MAGRATHEA_REDIS_URL")
+
+
+class KeyValueStore(Protocol):
+    """The subset of the redis-py client API used by shared caches and queues."""
+
+    def get(self, name: str) -> bytes | None: ...
+
+    def set(
+        self, name: str, value: bytes | str, ex: int | None = None, nx: bool = False
+    ) -> bool | None: ...
+
+    def delete(self, *names: str) -> int: ...
+
+    def lpush(self, name: str, *values: bytes | str) -> int: ...
+
+    def brpop(
+        self, keys: Sequence[str], timeout: float = 0
+    ) -> tuple[bytes, bytes] | None: ...
+
+    def llen(self, name: str) -> int: ...
+
+
+def _encode(value: bytes | str) -> bytes:
+    return value.encode() if isinstance(value, str) else value
+
+
+class InMemoryStore:
+    """Process-local stand-in for a Redis client, for tests and single workers.
+
+    Implements the same methods as `KeyValueStore` with Redis semantics: values
+    come back as bytes, `ex` expires keys after that many seconds and `nx` only
+    sets missing keys.
+    """
+
+    def __init__(self) -> None:
+        self._values: dict[str, tuple[bytes, float | None]] = {}
+        self._lists: dict[str, deque[bytes]] = {}
+        self._cond = threading.Condition()
+
+    def _live(self, name: str) -> bytes | None:
+        entry = self._values.get(name)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._values[name]
+            return None
+        return value
+
+    def get(self, name: str) -> bytes | None:
+        with self._cond:
+            return self._live(name)
+
+    def set(
+        self, name: str, value: bytes | str, ex: int | None = None, nx: bool = False
+    ) -> bool | None:
+        with self._cond:
+            if nx and self._live(name) is not None:
+                return None
+            expires_at = time.monotonic() + ex if ex is not None else None
+            self._values[name] = (_encode(value), expires_at)
+            return True
+
+    def delete(self, *names: str) -> int:
+        with self._cond:
+            deleted = 0
+            for name in names:
+                if self._values.pop(name, None) is not None:
+                    deleted += 1
+                if self._lists.pop(name, None) is not None:
+                    deleted += 1
+            return deleted
+
+    def renew_if_held(self, name: str, value: bytes | str, ex: int) -> bool:
+        with self._cond:
+            if self._live(name) != _encode(value):
+                return False
+            self._values[name] = (_encode(value), time.monotonic() + ex)
+            return True
+
+    def delete_if_held(self, name: str, value: bytes | str) -> bool:
+        with self._cond:
+            if self._live(name) != _encode(value):
+                return False
+            del self._values[name]
+            return True
+
+    def lpush(self, name: str, *values: bytes | str) -> int:
+        with self._cond:
+            items = self._lists.setdefault(name, deque())
+            for value in values:
+                items.appendleft(_encode(value))
+            self._cond.notify_all()
+            return len(items)
+
+    def brpop(
+        self, keys: Sequence[str], timeout: float = 0
+    ) -> tuple[bytes, bytes] | None:
+        deadline = time.monotonic() + timeout if timeout else None
+        with self._cond:
+            while True:
+                for key in keys:
+                    items = self._lists.get(key)
+                    if items:
+                        return key.encode(), items.pop()
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+
+    def llen(self, name: str) -> int:
+        with self._cond:
+            return len(self._lists.get(name, ()))
+
+
+# Compare-and-set scripts for leases, so that a holder whose lease lapsed
+# can't extend or delete the one another worker has taken since.
+_RENEW_IF_HELD = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("expire", KEYS[1], ARGV[2])
+end
+return 0
+"""
+_DELETE_IF_HELD = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+def renew_if_held(store: KeyValueStore, name: str, value: str, ex: int) -> bool:
+    """Atomically resets `name` to expire in `ex` seconds if it holds `value`."""
+    if isinstance(store, InMemoryStore):
+        return store.renew_if_held(name, value, ex)
+    return bool(cast(Any, store).eval(_RENEW_IF_HELD, 1, name, value, ex))
+
+
+def delete_if_held(store: KeyValueStore, name: str, value: str) -> bool:
+    """Atomically deletes `name` if it holds `value`."""
+    if isinstance(store, InMemoryStore):
+        return store.delete_if_held(name, value)
+    return bool(cast(Any, store).eval(_DELETE_IF_HELD, 1, name, value))
+
+
+def create_store(url: str | None = REDIS_URL) -> KeyValueStore | None:
+    """Connects to Redis at `url`, or returns None when no URL is configured."""
+    if not url:
+        return None
+    try:
+        import redis
+    except ImportError as e:
+        raise RuntimeError(
+            "MAGRATHEA_REDIS_URL is set but the redis package is not installed; "
+            "install it with `uv sync --extra redis`."
+        ) from e
+    # Without decode_responses the client returns bytes, as KeyValueStore expects.
+    return cast(KeyValueStore, redis.Redis.from_url(url))
+
+
+store = create_store()
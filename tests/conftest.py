@@ -0,0 +1,29 @@
+from pathlib import Path
+
+import pytest
+
+from magrathea.maps.render_cache import (
+    RENDER_CACHE_DISK_BYTES,
+    RENDER_CACHE_MEMORY_BYTES,
+    DiskCache,
+    MemoryCache,
+    render_cache,
+)
+from magrathea.maps.rendering_engine import warm_up
+
+
+@pytest.fixture(autouse=True, scope="session")
+def noise_kernels() -> None:
+    # The TestClient runs the app's lifespan on a thread of its own, and
+    # Numba's TBB threading layer hangs at exit when started off the main thread.
+    warm_up()
+
+
+@pytest.fixture(autouse=True)
+def isolated_render_cache(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Gives each test empty render cache tiers instead of ./render_cache."""
+    memory = MemoryCache(RENDER_CACHE_MEMORY_BYTES)
+    disk = DiskCache(tmp_path / "render_cache", RENDER_CACHE_DISK_BYTES)
+    monkeypatch.setattr(render_cache, "memory", memory)
+    monkeypatch.setattr(render_cache, "disk", disk)
+    monkeypatch.setattr(render_cache, "shared", None)
@@ -1,15 +1,32 @@
+import io
 import uuid
 from collections.abc import Generator
+from pathlib import Path
 
+import numpy as np
 import pytest
 from fastapi.testclient import TestClient
+from httpx import Response
+from PIL import Image
 from sqlalchemy import create_engine
 from sqlalchemy.orm import Session, sessionmaker
 from sqlalchemy.pool import StaticPool
 
 from magrathea.database import Base, get_db
 from magrathea.main import app
+from magrathea.maps import render_cache as render_cache_module
+from magrathea.maps.api import (
+    MAX_BATCH_MAPS,
+    MAX_JOB_SIZE,
+    MAX_OCTAVES,
+    MAX_SYNC_SIZE,
+)
+from magrathea.maps.blob_store import LocalBlobStore, get_blob_store
+from magrathea.maps.job_queue import JobQueue, WorkerThreads, get_job_queue
 from magrathea.maps.map import Map
+from magrathea.maps.render_cache import cache_key, render_cache
+from magrathea.maps.rendering_engine import generate_heightmap
+from magrathea.redis_store import InMemoryStore
 
 # Use in-memory SQLite for tests
 SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
@@ -34,14 +51,17 @@ def db_session() -> Generator[Session]:
 
 
 @pytest.fixture
-def client(db_session: Session) -> Generator[TestClient]:
+def client(db_session: Session, tmp_path: Path) -> Generator[TestClient]:
     def override_get_db() -> Generator[Session]:
         try:
             yield db_session
         finally:
             pass
 
+    test_blob_store = LocalBlobStore(tmp_path / "blobs")
+
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_blob_store] = lambda: test_blob_store
     with TestClient(app) as c:
         yield c
     app.dependency_overrides.clear()
@@ -64,6 +84,215 @@ def test_create_and_get_map(client: TestClient) -> None:
     assert len(response.content) > 0
 
 
+def test_tiled_map_serves_tiles(client: TestClient) -> None:
+    response = client.post(
+        "/maps", json={"size": 65536, "octaves": 2, "seed": 3, "tiled": True}
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["tiles_url"] == f"/maps/{data['id']}/tiles/{{z}}/{{x}}/{{y}}.png"
+
+    # Only the tiles are stored, never the full raster.
+    assert client.get(data["url"]).status_code == 404
+
+    tile_url = data["tiles_url"].format(z=8, x=128, y=127)
+    response = client.get(tile_url)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/png"
+    assert client.get(tile_url).content == response.content
+    etag = response.headers["etag"]
+    assert client.get(tile_url, headers={"If-None-Match": etag}).status_code == 304
+
+    assert client.get(data["tiles_url"].format(z=9, x=0, y=0)).status_code == 404
+    assert client.get(data["tiles_url"].format(z=1, x=2, y=0)).status_code == 404
+
+
+def test_stored_octaves_beyond_limit_are_not_rendered(
+    client: TestClient, db_session: Session
+) -> None:
+    data = client.post("/maps", json={"size": 64, "octaves": 2, "seed": 3}).json()
+    tiled = client.post(
+        "/maps", json={"size": 64, "octaves": 2, "seed": 3, "tiled": True}
+    ).json()
+    stored = client.get(data["url"]).content
+    for map_id in (data["id"], tiled["id"]):
+        db_session.get(Map, map_id).octaves = 2000
+    db_session.commit()
+
+    response = client.get(f"{data['url']}?format=webp")
+    assert response.headers["content-type"] == "image/png"
+    assert response.content == stored
+    tile_url = tiled["tiles_url"].format(z=0, x=0, y=0)
+    assert client.get(tile_url).status_code == 422
+
+
+def test_create_map_batch(client: TestClient) -> None:
+    response = client.post(
+        "/maps/batch", json={"size": 64, "octaves": 2, "seeds": [1, 2, 3]}
+    )
+    assert response.status_code == 200
+    maps = response.json()
+    assert len(maps) == 3
+    images = [client.get(m["url"]).content for m in maps]
+    assert all(image.startswith(b"\x89PNG") for image in images)
+    assert len(set(images)) == 3
+
+    response = client.post("/maps/batch", json={"size": 64, "count": 2})
+    assert len(response.json()) == 2
+
+    response = client.post("/maps/batch", json={"size": 64, "count": 0})
+    assert response.status_code == 422
+
+
+@pytest.mark.parametrize(
+    ("method", "url", "body"),
+    [
+        ("GET", "/map?seed=-1", None),
+        ("GET", "/map?size=0", None),
+        ("GET", "/map?octaves=0", None),
+        ("POST", "/maps", {"seed": -1}),
+        ("POST", "/maps", {"seed": 2**63}),
+        ("POST", "/maps", {"size": 0}),
+        ("POST", "/maps", {"octaves": 0}),
+        ("GET", f"/map?octaves={MAX_OCTAVES + 1}", None),
+        ("POST", "/maps", {"octaves": MAX_OCTAVES + 1}),
+        ("POST", "/maps/batch", {"octaves": MAX_OCTAVES + 1, "count": 1}),
+        ("POST", "/jobs", {"octaves": MAX_OCTAVES + 1}),
+        ("POST", "/maps/batch", {"seeds": [1, -1]}),
+        ("POST", "/maps/batch", {"size": 0, "count": 1}),
+        ("POST", "/maps/batch", {"octaves": 0, "count": 1}),
+        ("POST", "/jobs", {"seed": -1}),
+        ("GET", f"/map?size={MAX_SYNC_SIZE + 1}", None),
+        ("POST", "/maps", {"size": MAX_SYNC_SIZE + 1}),
+        ("POST", "/maps/batch", {"size": MAX_SYNC_SIZE + 1, "count": 1}),
+        ("POST", "/maps/batch", {"count": 10**9}),
+        ("POST", "/maps/batch", {"seeds": []}),
+        ("POST", "/maps/batch", {"seeds": list(range(MAX_BATCH_MAPS + 1))}),
+        (
+            "POST",
+            "/map_create",
+            {"size": 0, "seed_height": 1, "seed_heat": 2, "seed_wet": 3},
+        ),
+        (
+            "POST",
+            "/map_create",
+            {"size": 64, "seed_height": -1, "seed_heat": 2, "seed_wet": 3},
+        ),
+    ],
+)
+def test_invalid_map_parameters_are_rejected(
+    client: TestClient, method: str, url: str, body: dict[str, object] | None
+) -> None:
+    response = client.request(method, url, json=body)
+    assert response.status_code == 422
+
+
+def test_stored_heightmap_is_served_raw(client: TestClient) -> None:
+    response = client.post(
+        "/maps",
+        json={"size": 64, "octaves": 2, "seed": 8, "store_heightmap": True},
+    )
+    map_id = response.json()["id"]
+
+    response = client.get(f"/maps/{map_id}/heightmap")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/octet-stream"
+    dtype = np.dtype(response.headers["x-heightmap-dtype"])
+    shape = tuple(int(n) for n in response.headers["x-heightmap-shape"].split(","))
+    heightmap = np.frombuffer(response.content, dtype=dtype).reshape(shape)
+
+    expected = generate_heightmap(64, 2, seed=8).astype(np.float32)
+    assert np.array_equal(heightmap, expected)
+
+    response = client.get(f"/maps/{map_id}/heightmap?format=npy")
+    assert np.array_equal(np.load(io.BytesIO(response.content)), expected)
+
+
+def test_heightmap_missing_when_not_stored(client: TestClient) -> None:
+    map_id = client.post("/maps", json={"size": 64, "octaves": 2}).json()["id"]
+
+    assert client.get(f"/maps/{map_id}/heightmap").status_code == 404
+
+
+def test_get_map_thumbnail(client: TestClient) -> None:
+    map_url = client.post("/maps", json={"size": 256, "octaves": 2}).json()["url"]
+
+    def width(response: Response) -> int:
+        return int.from_bytes(response.content[16:20], "big")
+
+    assert width(client.get(map_url)) == 256
+    assert width(client.get(f"{map_url}?max_px=100")) == 64
+    assert width(client.get(f"{map_url}?max_px=128")) == 128
+    assert width(client.get(f"{map_url}?max_px=8")) == 32
+    assert width(client.get(f"{map_url}?max_px=1000")) == 256
+
+
+def test_get_map_range_request(client: TestClient) -> None:
+    response = client.post("/maps", json={"size": 64, "octaves": 2})
+    map_url = response.json()["url"]
+
+    response = client.get(map_url, headers={"Range": "bytes=0-7"})
+    assert response.status_code == 206
+    assert response.content == b"\x89PNG\r\n\x1a\n"
+
+
+def test_stored_map_is_immutable(client: TestClient) -> None:
+    map_url = client.post("/maps", json={"size": 64, "octaves": 2}).json()["url"]
+
+    response = client.get(map_url)
+    etag = response.headers["etag"]
+    assert "immutable" in response.headers["cache-control"]
+
+    response = client.get(map_url, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    # Thumbnails are other representations, with their own validators.
+    assert client.get(f"{map_url}?max_px=32").headers["etag"] != etag
+
+
+def test_encoded_map_conditional_and_range(client: TestClient) -> None:
+    map_url = client.post("/maps", json={"size": 64, "octaves": 2}).json()["url"]
+    full = client.get(f"{map_url}?format=webp")
+
+    response = client.get(
+        f"{map_url}?format=webp", headers={"If-None-Match": full.headers["etag"]}
+    )
+    assert response.status_code == 304
+
+    response = client.get(f"{map_url}?format=webp", headers={"Range": "bytes=-4"})
+    assert response.status_code == 206
+    assert response.content == full.content[-4:]
+    total = len(full.content)
+    assert response.headers["content-range"] == f"bytes {total - 4}-{total - 1}/{total}"
+
+
+def test_quick_generate_map_validators(client: TestClient) -> None:
+    url = "/map?size=64&octaves=2&seed=11"
+    first = client.get(url)
+    etag = first.headers["etag"]
+    assert "immutable" in first.headers["cache-control"]
+
+    # Cached and freshly rendered responses carry the same validator.
+    assert client.get(url).headers["etag"] == etag
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+    assert client.get("/map?size=64&octaves=2").headers["cache-control"] == "no-store"
+
+
+def test_metrics(client: TestClient) -> None:
+    client.post("/maps", json={"size": 64, "octaves": 2})
+    client.get("/map?size=64&octaves=2&seed=5")
+
+    response = client.get("/metrics")
+
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    body = response.text
+    for stage in ("noise", "mask", "normalize", "colorize", "encode", "db_write"):
+        assert f'magrathea_stage_seconds_count{{stage="{stage}"}}' in body
+    assert "magrathea_render_cache_hit_ratio " in body
+    assert 'magrathea_pool_maps{bucket="128:4:0.0"} 0' in body
+    assert "magrathea_job_queue_length 0" in body
+
+
 def test_get_nonexistent_map(client: TestClient) -> None:
     response = client.get("/maps/nonexistent-id")
     assert response.status_code == 404
@@ -86,6 +315,51 @@ def test_quick_generate_map(client: TestClient) -> None:
     assert len(response.content) > 0
 
 
+def test_quick_generate_map_formats(client: TestClient) -> None:
+    response = client.get("/map?size=64&octaves=2&seed=3&format=webp")
+    assert response.headers["content-type"] == "image/webp"
+    assert response.headers["vary"] == "Accept"
+    assert response.content[8:12] == b"WEBP"
+
+    response = client.get(
+        "/map?size=64&octaves=2&seed=3", headers={"Accept": "image/webp"}
+    )
+    assert response.headers["content-type"] == "image/webp"
+
+    response = client.get("/map?size=64&octaves=2&seed=3&format=raw")
+    assert response.headers["x-heightmap-shape"] == "64,64"
+    assert len(response.content) == 64 * 64 * 4
+
+
+def test_get_map_in_other_format(client: TestClient) -> None:
+    map_url = client.post("/maps", json={"size": 128, "octaves": 2}).json()["url"]
+
+    response = client.get(f"{map_url}?format=png8&max_px=64")
+
+    assert response.headers["content-type"] == "image/png"
+    image = Image.open(io.BytesIO(response.content))
+    assert image.mode == "P"
+    assert image.size == (64, 64)
+
+
+def test_browser_gets_stored_png_of_seedless_map(
+    client: TestClient, db_session: Session
+) -> None:
+    data = client.post("/maps", json={"size": 64, "octaves": 2}).json()
+    db_session.get(Map, data["id"]).seed = None
+    db_session.commit()
+    stored = client.get(data["url"]).content
+
+    browser = {"Accept": "image/avif,image/webp,image/apng,*/*;q=0.8"}
+    for response in (
+        client.get(data["url"], headers=browser),
+        client.get(f"{data['url']}?format=webp"),
+    ):
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "image/png"
+        assert response.content == stored
+
+
 def test_favicon(client: TestClient) -> None:
     response = client.get("/favicon.ico")
     assert response.status_code == 200
@@ -104,7 +378,9 @@ def test_pregenerated_map_consumption(client: TestClient, db_session: Session) -
         octaves=2,
         seed=12345,
         island_density=0.0,
-        data=b"fake_data",
+        blob_key="fake_key",
+        byte_size=9,
+        content_hash="fake_hash",
         is_pregenerated=True,
     )
     db_session.add(pre_gen_map)
@@ -123,3 +399,95 @@ def test_pregenerated_map_consumption(client: TestClient, db_session: Session) -
     # 4. Verify it is no longer marked as pre-generated in DB
     db_session.refresh(pre_gen_map)
     assert pre_gen_map.is_pregenerated is False
+
+
+def test_quick_generate_seeded_map_is_cached(client: TestClient) -> None:
+    first = client.get("/map?size=64&octaves=2&seed=7")
+    second = client.get("/map?size=64&octaves=2&seed=7")
+
+    assert first.status_code == 200
+    assert second.status_code == 200
+    assert first.content == second.content
+    assert render_cache.get(cache_key(64, 2, 7, 0.0)) == first.content
+
+
+def test_create_seeded_map_is_cached(
+    client: TestClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    generated = []
+
+    def counting_generate(*args: object, **kwargs: object) -> np.ndarray:
+        generated.append(args)
+        return generate_heightmap(*args, **kwargs)
+
+    monkeypatch.setattr(render_cache_module, "generate_heightmap", counting_generate)
+    body = {"size": 128, "octaves": 2, "seed": 13}
+    first = client.post("/maps", json=body).json()["url"]
+    second = client.post("/maps", json=body).json()["url"]
+
+    assert len(generated) == 1
+    for query in ("", "?max_px=64", "?max_px=32"):
+        assert client.get(first + query).content == client.get(second + query).content
+
+
+def test_job_runs_in_background(client: TestClient, tmp_path: Path) -> None:
+    queue = JobQueue(InMemoryStore())
+    app.dependency_overrides[get_job_queue] = lambda: queue
+    workers = WorkerThreads(
+        queue,
+        poll_timeout=0.05,
+        session_factory=TestingSessionLocal,
+        blobs=LocalBlobStore(tmp_path / "blobs"),
+    )
+    workers.start()
+    try:
+        response = client.post("/jobs", json={"size": 64, "octaves": 2, "seed": 11})
+        assert response.status_code == 202
+        job_id = response.json()["id"]
+
+        # The event stream ends once the job has finished.
+        with client.stream("GET", f"/jobs/{job_id}/events") as events:
+            assert events.headers["content-type"].startswith("text/event-stream")
+            lines = [line for line in events.iter_lines() if line.startswith("event:")]
+        assert lines[-1] == "event: done"
+    finally:
+        workers.stop()
+
+    job = client.get(f"/jobs/{job_id}").json()
+    assert job["status"] == "done"
+    # The result is stored as a map, which no request size limit applies to.
+    assert job["url"] == f"/maps/{job_id}"
+    image = client.get(job["url"])
+    assert image.status_code == 200
+    assert image.content == client.get("/map?size=64&octaves=2&seed=11").content
+
+
+def test_job_request_is_bounded(client: TestClient) -> None:
+    response = client.post("/jobs", json={"size": MAX_JOB_SIZE + 1})
+    assert response.status_code == 422
+
+    response = client.post("/jobs", json={"size": 64, "tiled": True})
+    assert response.status_code == 422
+
+
+def test_full_job_queue_returns_429(client: TestClient) -> None:
+    app.dependency_overrides[get_job_queue] = lambda: JobQueue(
+        InMemoryStore(), max_depth=0
+    )
+
+    response = client.post("/jobs", json={"size": 64, "octaves": 2})
+
+    assert response.status_code == 429
+    assert "retry-after" in response.headers
+    assert client.get("/jobs/missing").status_code == 404
+
+
+def test_map_create_renders_biome_map(client: TestClient) -> None:
+    response = client.post(
+        "/map_create",
+        json={"size": 64, "seed_height": 1, "seed_heat": 2, "seed_wet": 3},
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/png"
+    assert response.content.startswith(b"\x89PNG")
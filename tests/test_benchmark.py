@@ -0,0 +1,73 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from magrathea.maps import benchmark
+from magrathea.maps.benchmark import (
+    Result,
+    compare,
+    load_results,
+    run_benchmarks,
+    save_results,
+)
+
+
+def result(seconds: float, allocated: int = 1 << 20, size: int = 64) -> Result:
+    return Result("heightmap", size, 4, seconds, seconds, 1 << 28, allocated)
+
+
+def test_run_benchmarks_in_process() -> None:
+    results = run_benchmarks(
+        ["heightmap", "png", "http"], [32], [1, 2], repeat=1, isolate=False
+    )
+
+    assert [r.key for r in results] == [
+        ("heightmap", 32, 1),
+        ("heightmap", 32, 2),
+        ("png", 32, 1),
+        ("png", 32, 2),
+        ("http", 32, 1),
+        ("http", 32, 2),
+    ]
+    assert all(r.seconds > 0 and r.peak_rss_bytes > 0 for r in results)
+    assert results[0].allocated_peak_bytes >= 32 * 32 * 8
+
+
+def test_http_skips_sizes_the_app_rejects(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(benchmark, "max_http_size", lambda: 32)
+
+    results = run_benchmarks(
+        ["heightmap", "http"], [32, 48], [1], repeat=1, isolate=False
+    )
+
+    assert [r.key for r in results] == [
+        ("heightmap", 32, 1),
+        ("heightmap", 48, 1),
+        ("http", 32, 1),
+    ]
+
+
+def test_compare_flags_regressions_over_threshold() -> None:
+    baseline = [result(0.100), result(0.100, size=128)]
+
+    assert compare([result(0.110), result(0.120, size=128)], baseline, 0.25) == []
+    (regression,) = compare([result(0.150)], baseline, 0.25)
+    assert regression.metric == "seconds"
+    assert regression.ratio == pytest.approx(1.5)
+    (regression,) = compare([result(0.1, allocated=4 << 20)], baseline, 0.25)
+    assert regression.metric == "allocated_peak_bytes"
+
+
+def test_compare_ignores_noise_and_new_cases() -> None:
+    # Doubling a sub-millisecond timing is within timer noise.
+    assert compare([result(0.0004)], [result(0.0002)]) == []
+    assert compare([result(1.0, size=256)], [result(0.1)]) == []
+
+
+def test_results_round_trip(tmp_path: Path) -> None:
+    path = tmp_path / "results.json"
+    save_results(path, [result(0.1)])
+
+    assert load_results(path) == [result(0.1)]
+    assert json.loads(path.read_text())["engine_version"]
@@ -0,0 +1,38 @@
+import hashlib
+from pathlib import Path
+
+import numpy as np
+
+from magrathea.maps.blob_store import LocalBlobStore, encode_array, load_array
+
+
+def test_put_and_get(tmp_path: Path) -> None:
+    store = LocalBlobStore(tmp_path)
+    blob = store.put(b"map data")
+
+    assert blob.byte_size == len(b"map data")
+    assert blob.content_hash == hashlib.sha256(b"map data").hexdigest()
+    assert store.get(blob.key) == b"map data"
+    path = store.local_path(blob.key)
+    assert path is not None and path.read_bytes() == b"map data"
+
+
+def test_identical_content_is_stored_once(tmp_path: Path) -> None:
+    store = LocalBlobStore(tmp_path)
+    first = store.put(b"same")
+    second = store.put(b"same")
+
+    assert first == second
+    assert len([p for p in tmp_path.rglob("*") if p.is_file()]) == 1
+
+
+def test_array_blob_is_memory_mapped(tmp_path: Path) -> None:
+    store = LocalBlobStore(tmp_path)
+    array = np.arange(12, dtype=np.float32).reshape(3, 4)
+
+    ref = store.put(encode_array(array), ".npy")
+    loaded = load_array(store, ref.key)
+
+    assert ref.key.endswith(".npy")
+    assert isinstance(loaded, np.memmap)
+    assert np.array_equal(loaded, array)
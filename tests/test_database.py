@@ -0,0 +1,76 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+from sqlalchemy import QueuePool, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateIndex, CreateTable
+
+from magrathea.database import (
+    DATABASE_POOL_SIZE,
+    SQLITE_BUSY_TIMEOUT,
+    Base,
+    create_db_engine,
+    engine_options,
+)
+from magrathea.maps.api import MAX_SEED
+from magrathea.maps.map import Map
+
+
+def test_sqlite_connections_use_wal(tmp_path: Path) -> None:
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'test.db'}")
+
+    with engine.connect() as connection:
+
+        def pragma(name: str) -> object:
+            return connection.execute(text(f"PRAGMA {name}")).scalar()
+
+        assert pragma("journal_mode") == "wal"
+        assert pragma("synchronous") == 1  # NORMAL
+        assert pragma("busy_timeout") == SQLITE_BUSY_TIMEOUT
+    assert isinstance(engine.pool, QueuePool)
+    assert engine.pool.size() == DATABASE_POOL_SIZE
+
+
+def test_server_databases_get_a_checked_pool() -> None:
+    options = engine_options("postgresql+psycopg://magrathea@db/magrathea")
+
+    assert options["pool_pre_ping"]
+    assert options["pool_size"] == DATABASE_POOL_SIZE
+    assert "connect_args" not in options
+
+
+def test_schema_compiles_for_postgres() -> None:
+    dialect = postgresql.dialect()
+    for table in Base.metadata.sorted_tables:
+        str(CreateTable(table).compile(dialect=dialect))
+        for index in table.indexes:
+            str(CreateIndex(index).compile(dialect=dialect))
+
+    # Seeds up to MAX_SEED need a 64-bit column; INTEGER is 32-bit there.
+    ddl = str(CreateTable(Map.__table__).compile(dialect=dialect))
+    assert "seed BIGINT" in ddl
+    assert MAX_SEED <= 2**63 - 1
+
+
+def test_in_memory_sqlite_is_not_pooled() -> None:
+    assert "pool_size" not in engine_options("sqlite:///:memory:")
+
+
+def test_database_url_from_environment(tmp_path: Path) -> None:
+    url = f"sqlite:///{tmp_path / 'other.db'}"
+    output = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "from magrathea.database import engine; "
+            "print(engine.url.render_as_string(hide_password=False))",
+        ],
+        capture_output=True,
+        check=True,
+        text=True,
+        env={**os.environ, "MAGRATHEA_DATABASE_URL": url},
+    ).stdout
+
+    assert output.strip() == url
@@ -0,0 +1,61 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from magrathea.maps.encoders import ENCODERS, OutputFormat, encode, negotiate_format
+from magrathea.maps.rendering_engine import (
+    HEIGHTMAP_DTYPE,
+    colorize,
+    generate_heightmap,
+)
+
+
+@pytest.mark.parametrize("format", ["png", "png8", "webp"])
+def test_image_formats_decode_to_colorized_heightmap(format: OutputFormat) -> None:
+    heightmap = generate_heightmap(96, 3, seed=4, island_density=0.2)
+
+    image = Image.open(io.BytesIO(encode(heightmap, format)))
+
+    assert Image.MIME[image.format] == ENCODERS[format].media_type
+    assert np.array_equal(np.asarray(image.convert("RGB")), colorize(heightmap))
+
+
+def test_raw_format_is_float32_heightmap() -> None:
+    heightmap = generate_heightmap(32, 2, seed=4)
+
+    data = np.frombuffer(encode(heightmap, "raw"), dtype=HEIGHTMAP_DTYPE)
+
+    assert np.array_equal(data.reshape(32, 32), heightmap.astype(HEIGHTMAP_DTYPE))
+
+
+def test_palette_png_is_smaller_than_rgb_png() -> None:
+    heightmap = generate_heightmap(256, 4, seed=4)
+
+    assert len(encode(heightmap, "png8")) < len(encode(heightmap, "png"))
+
+
+def test_compression_level_trades_size() -> None:
+    heightmap = generate_heightmap(128, 4, seed=4)
+
+    assert len(encode(heightmap, "png", 9)) < len(encode(heightmap, "png", 0))
+
+
+@pytest.mark.parametrize(
+    ("accept", "expected"),
+    [
+        (None, "png"),
+        ("*/*", "png"),
+        ("image/webp", "webp"),
+        ("image/webp;q=0.9, image/avif", "webp"),
+        ("image/webp,image/png;q=0.8", "png"),
+        ("image/avif,image/webp,image/apng,*/*;q=0.8", "png"),
+        ("image/webp, image/*;q=0.1", "png"),
+        ("image/webp;q=0, image/png", "png"),
+        ("application/octet-stream", "raw"),
+        ("text/html", "png"),
+    ],
+)
+def test_negotiate_format(accept: str | None, expected: OutputFormat) -> None:
+    assert negotiate_format(accept) == expected
@@ -1,6 +1,16 @@
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
+import pytest
 
-from magrathea.maps.rendering_engine import generate_heightmap
+from magrathea.maps import rendering_engine
+from magrathea.maps.rendering_engine import (
+    downsample,
+    generate_heightmap,
+    generate_heightmaps,
+    island_mask,
+    mip_levels,
+)
 
 
 def test_heightmap_shape() -> None:
@@ -55,3 +65,63 @@ def test_heightmap_density() -> None:
     val_high = hm_high[center, center]
 
     assert val_high > val_low, "Higher density should increase elevation"
+
+
+def test_heightmap_parallel_matches_serial() -> None:
+    size = 200
+    octaves = 3
+    seed = 7
+
+    serial = generate_heightmap(size, octaves, seed=seed, workers=1)
+    parallel = generate_heightmap(size, octaves, seed=seed, workers=4)
+
+    assert np.array_equal(serial, parallel), "Parallel output should be bit-identical"
+
+
+def test_concurrent_parallel_renders() -> None:
+    seeds = list(range(8))
+    expected = [generate_heightmap(128, 3, seed, workers=1) for seed in seeds]
+
+    def render(seed: int) -> tuple[np.ndarray, np.ndarray]:
+        return (
+            generate_heightmap(128, 3, seed, workers=4),
+            generate_heightmaps(128, 3, [seed], workers=4)[0],
+        )
+
+    # Parallel kernels called from several threads at once must neither
+    # abort the process nor change the output.
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(executor.map(render, seeds))
+
+    for (single, batched), reference in zip(results, expected, strict=True):
+        assert np.array_equal(single, reference)
+        assert np.array_equal(batched, reference)
+
+
+def test_island_mask_is_cached_and_read_only(monkeypatch: pytest.MonkeyPatch) -> None:
+    mask = island_mask(64)
+    assert island_mask(64, 8, 16).base is mask.base
+    with pytest.raises(ValueError):
+        mask[0, 0] = 1.0
+
+    # Masks too large to cache are built band by band with the same values.
+    monkeypatch.setattr(rendering_engine, "MASK_CACHE_MAX_SIZE", 32)
+    assert np.array_equal(island_mask(64, 8, 16), mask[8:16])
+
+
+def test_batched_heightmaps_match_individual_ones() -> None:
+    seeds = [3, 1, 4, 1, 5]
+
+    for workers in (1, 2):
+        heightmaps = generate_heightmaps(48, 3, seeds, 0.1, workers=workers)
+        assert heightmaps.shape == (len(seeds), 48, 48)
+        for seed, heightmap in zip(seeds, heightmaps, strict=True):
+            assert np.array_equal(heightmap, generate_heightmap(48, 3, seed, 0.1))
+
+
+def test_mip_levels_average_blocks() -> None:
+    heightmap = np.arange(16, dtype=np.float64).reshape(4, 4)
+    assert np.array_equal(downsample(heightmap), [[2.5, 4.5], [10.5, 12.5]])
+
+    levels = list(mip_levels(generate_heightmap(256, 2, seed=1), min_size=32))
+    assert [len(level) for level in levels] == [128, 64, 32]
@@ -0,0 +1,68 @@
+import pytest
+
+from magrathea.maps.http_cache import (
+    Conditions,
+    cacheable_response,
+    etag_matches,
+    parse_range,
+)
+
+
+@pytest.mark.parametrize(
+    ("header", "expected"),
+    [
+        (None, False),
+        ('"abc"', True),
+        ('W/"abc"', True),
+        ('"xyz", "abc"', True),
+        ('"xyz"', False),
+        ("*", True),
+    ],
+)
+def test_etag_matches(header: str | None, expected: bool) -> None:
+    assert etag_matches(header, '"abc"') is expected
+
+
+@pytest.mark.parametrize(
+    ("header", "expected"),
+    [
+        ("bytes=0-9", (0, 9)),
+        ("bytes=90-", (90, 99)),
+        ("bytes=-10", (90, 99)),
+        ("bytes=-500", (0, 99)),
+        ("bytes=95-200", (95, 99)),
+        ("bytes=0-1,5-6", None),
+        ("items=0-9", None),
+        ("bytes=9-0", None),
+        ("bytes=a-b", None),
+    ],
+)
+def test_parse_range(header: str, expected: tuple[int, int] | None) -> None:
+    assert parse_range(header, 100) == expected
+
+
+@pytest.mark.parametrize("header", ["bytes=100-", "bytes=-0"])
+def test_parse_unsatisfiable_range(header: str) -> None:
+    with pytest.raises(ValueError):
+        parse_range(header, 100)
+
+
+def test_not_modified_skips_render() -> None:
+    def render() -> bytes:
+        raise AssertionError("rendered")
+
+    response = cacheable_response(
+        Conditions(if_none_match='"k"'), '"k"', render, "image/png"
+    )
+
+    assert response.status_code == 304
+    assert response.headers["etag"] == '"k"'
+
+
+def test_if_range_mismatch_sends_everything() -> None:
+    conditions = Conditions(range="bytes=0-1", if_range='"old"')
+
+    response = cacheable_response(conditions, '"k"', lambda: b"abcdef", "text/plain")
+
+    assert response.status_code == 200
+    assert response.body == b"abcdef"
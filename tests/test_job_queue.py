@@ -0,0 +1,133 @@
+import threading
+from pathlib import Path
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from magrathea.database import Base
+from magrathea.maps.blob_store import LocalBlobStore
+from magrathea.maps.job_queue import JobQueue, MapJob, QueueFullError, process_job
+from magrathea.maps.map import Map
+from magrathea.maps.render_cache import (
+    DiskCache,
+    MemoryCache,
+    RenderCache,
+    SharedCache,
+)
+from magrathea.redis_store import InMemoryStore
+
+
+def make_cache(store: InMemoryStore, tmp_path: Path) -> RenderCache:
+    return RenderCache(
+        MemoryCache(max_bytes=1024 * 1024),
+        DiskCache(tmp_path, max_bytes=1024 * 1024),
+        SharedCache(store),
+    )
+
+
+def test_in_memory_store_set_nx_and_expiry() -> None:
+    store = InMemoryStore()
+    assert store.set("k", "v", nx=True)
+    assert store.set("k", "other", nx=True) is None
+    assert store.get("k") == b"v"
+
+    store.set("short", b"x", ex=0)
+    assert store.get("short") is None
+
+
+def test_render_lock_is_only_released_by_its_holder() -> None:
+    shared = SharedCache(InMemoryStore())
+    token = shared.claim("key")
+    assert token is not None
+    assert shared.claim("key") is None
+
+    # A worker whose lock expired must not drop the lock another one took since.
+    shared.release("key", "expired-token")
+    assert shared.claim("key") is None
+
+    shared.release("key", token)
+    assert shared.claim("key") is not None
+
+
+def test_queue_is_fifo() -> None:
+    queue = JobQueue(InMemoryStore())
+    first = queue.enqueue(MapJob(size=32, octaves=1, seed=1))
+    second = queue.enqueue(MapJob(size=32, octaves=1, seed=2))
+
+    assert len(queue) == 2
+    dequeued = queue.dequeue(timeout=1)
+    assert dequeued is not None and dequeued.id == first.id
+    dequeued = queue.dequeue(timeout=1)
+    assert dequeued is not None and dequeued.id == second.id
+    assert queue.dequeue(timeout=0.01) is None
+
+
+def test_processed_job_is_shared_between_workers(tmp_path: Path) -> None:
+    store = InMemoryStore()
+    queue = JobQueue(store)
+    job = queue.enqueue(MapJob(size=32, octaves=2, seed=3))
+    engine = create_engine(f"sqlite:///{tmp_path / 'jobs.db'}")
+    Base.metadata.create_all(bind=engine)
+    session_local = sessionmaker(bind=engine)
+    blobs = LocalBlobStore(tmp_path / "blobs")
+
+    state = queue.get_state(job.id)
+    assert state is not None and state.status == "queued"
+
+    dequeued = queue.dequeue(timeout=1)
+    assert dequeued is not None
+    process_job(
+        queue, dequeued, session_local, blobs, cache=make_cache(store, tmp_path / "a")
+    )
+
+    state = queue.get_state(job.id)
+    assert state is not None and state.status == "done"
+    assert state.url == job.url == f"/maps/{job.id}"
+    # The result is stored as a map under the job's id.
+    with session_local() as db:
+        stored = db.get(Map, job.id)
+        assert stored is not None and stored.blob_key is not None
+        assert blobs.get(stored.blob_key).startswith(b"\x89PNG")
+    # A second worker with its own local tiers sees the result via the store.
+    other = make_cache(store, tmp_path / "b")
+    assert other.get(job.cache_key) is not None
+
+
+def test_concurrent_identical_renders_are_deduplicated(tmp_path: Path) -> None:
+    store = InMemoryStore()
+    caches = [make_cache(store, tmp_path / str(i)) for i in range(4)]
+    calls = []
+    started = threading.Event()
+
+    def render() -> bytes:
+        calls.append(1)
+        started.wait(timeout=1)
+        return b"png"
+
+    results: list[bytes] = []
+    threads = [
+        threading.Thread(
+            target=lambda c=c: results.append(c.get_or_render("key", render))
+        )
+        for c in caches
+    ]
+    for t in threads:
+        t.start()
+    started.set()
+    for t in threads:
+        t.join()
+
+    assert results == [b"png"] * 4
+    assert len(calls) == 1
+
+
+def test_full_queue_rejects_jobs() -> None:
+    queue = JobQueue(InMemoryStore(), max_depth=1)
+    queue.enqueue(MapJob(size=32, octaves=1, seed=1))
+
+    with pytest.raises(QueueFullError):
+        queue.enqueue(MapJob(size=32, octaves=1, seed=2))
+
+    queue.dequeue(timeout=1)
+    queue.enqueue(MapJob(size=32, octaves=1, seed=2))
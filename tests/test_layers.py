@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from magrathea.maps.layers import LayerCache, layered_heightmap
+from magrathea.maps.rendering_engine import generate_heightmap
+from magrathea.maps.world_map import WorldMap
+
+
+def test_layered_heightmap_matches_full_generation() -> None:
+    cache = LayerCache(max_bytes=1024 * 1024)
+
+    for density in (0.0, 0.3, -0.2):
+        heightmap = layered_heightmap(64, 3, 5, density, cache=cache)
+        assert np.array_equal(heightmap, generate_heightmap(64, 3, 5, density))
+    # One noise layer, reused for every density.
+    assert len(cache) == 1
+
+
+def test_changing_density_only_reapplies_mask(monkeypatch: pytest.MonkeyPatch) -> None:
+    cache = LayerCache(max_bytes=1024 * 1024)
+    layered_heightmap(64, 3, 5, 0.0, cache=cache)
+
+    def fail(*args: object) -> None:
+        raise AssertionError("noise should come from the cache")
+
+    monkeypatch.setattr("magrathea.maps.layers.octave_noise", fail)
+    layered_heightmap(64, 3, 5, 0.4, cache=cache)
+
+
+def test_cached_layers_are_read_only_and_bounded() -> None:
+    cache = LayerCache(max_bytes=64 * 64 * 8)
+
+    first = cache.get_or_compute("a", lambda: np.zeros((64, 64)))
+    with pytest.raises(ValueError):
+        first[0, 0] = 1.0
+
+    cache.get_or_compute("b", lambda: np.ones((64, 64)))
+    assert len(cache) == 1
+    assert cache.nbytes == 64 * 64 * 8
+
+
+def test_world_map_reuses_unchanged_fields() -> None:
+    cache = LayerCache(max_bytes=1024 * 1024)
+    world = WorldMap(size=64, seed_height=1, seed_heat=2, seed_wet=3, cache=cache)
+    world.biome_map()
+
+    edited = WorldMap(size=64, seed_height=1, seed_heat=2, seed_wet=4, cache=cache)
+    edited.biome_map()
+
+    assert edited.heightmap.values is world.heightmap.values
+    assert edited.heat_map.values is world.heat_map.values
+    assert edited.wet_map.values is not world.wet_map.values
+    assert len(cache) == 4
@@ -0,0 +1,66 @@
+from fastapi.testclient import TestClient
+
+from magrathea.main import app
+from magrathea.maps.layers import layer_cache
+from magrathea.metrics import (
+    Counter,
+    Histogram,
+    ServerTimingMiddleware,
+    gauge,
+    render_metrics,
+    stage_seconds,
+    timed,
+)
+
+
+def test_histogram_renders_cumulative_buckets() -> None:
+    histogram = Histogram("t_seconds", "Test.", "stage", [0.1, 1.0])
+    for value in (0.05, 0.5, 0.7, 5.0):
+        histogram.observe("noise", value)
+
+    lines = histogram.render()
+
+    assert 't_seconds_bucket{stage="noise",le="0.1"} 1' in lines
+    assert 't_seconds_bucket{stage="noise",le="1.0"} 3' in lines
+    assert 't_seconds_bucket{stage="noise",le="+Inf"} 4' in lines
+    assert 't_seconds_sum{stage="noise"} 6.25' in lines
+    assert 't_seconds_count{stage="noise"} 4' in lines
+
+
+def test_render_metrics_exposition() -> None:
+    counter = Counter("t_total", "Lookups.", "result")
+    counter.inc("hit")
+    counter.inc("hit")
+
+    body = render_metrics(
+        [counter.render(), gauge("t_depth", "Depth.", {"a": 1, "b": 2}, "bucket")]
+    )
+
+    assert body.splitlines() == [
+        "# HELP t_total Lookups.",
+        "# TYPE t_total counter",
+        't_total{result="hit"} 2.0',
+        "# HELP t_depth Depth.",
+        "# TYPE t_depth gauge",
+        't_depth{bucket="a"} 1',
+        't_depth{bucket="b"} 2',
+    ]
+
+
+def test_timed_feeds_stage_histogram() -> None:
+    before = stage_seconds.count("test_stage")
+    with timed("test_stage"):
+        pass
+
+    assert stage_seconds.count("test_stage") == before + 1
+
+
+def test_server_timing_header() -> None:
+    layer_cache.clear()
+    client = TestClient(ServerTimingMiddleware(app))
+
+    response = client.get("/map?size=64&octaves=2&seed=12345")
+
+    header = response.headers["server-timing"]
+    stages = [entry.split(";")[0] for entry in header.split(", ")]
+    assert {"cache_lookup", "noise", "mask", "normalize", "total"} <= set(stages)
@@ -0,0 +1,20 @@
+import numpy as np
+from matplotlib.colors import LinearSegmentedColormap
+
+from magrathea.maps.palettes import SEA_SAND_GRASS, SEA_SAND_GRASS_LUT, apply_lut
+
+
+def test_lut_matches_matplotlib_colormap() -> None:
+    cmap = LinearSegmentedColormap.from_list("sea_sand_grass", SEA_SAND_GRASS, N=256)
+    values = np.linspace(0.0, 1.0, 10007)
+
+    expected = cmap(values, bytes=True)[..., :3]
+
+    assert np.array_equal(apply_lut(values, SEA_SAND_GRASS_LUT), expected)
+
+
+def test_apply_lut_shape() -> None:
+    values = np.zeros((4, 5))
+    rgb = apply_lut(values, SEA_SAND_GRASS_LUT)
+    assert rgb.shape == (4, 5, 3)
+    assert rgb.dtype == np.uint8
@@ -0,0 +1,81 @@
+import threading
+import uuid
+from pathlib import Path
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from magrathea.database import Base
+from magrathea.maps.map import Map
+from magrathea.maps.pool import claim_pregenerated_map
+
+
+def add_pool_map(db_session_factory: sessionmaker, size: int = 64) -> str:
+    map_id = str(uuid.uuid4())
+    with db_session_factory() as db:
+        db.add(
+            Map(
+                id=map_id,
+                size=size,
+                octaves=2,
+                seed=1,
+                island_density=0.0,
+                blob_key="fake_key",
+                byte_size=9,
+                content_hash="fake_hash",
+                is_pregenerated=True,
+            )
+        )
+        db.commit()
+    return map_id
+
+
+def test_claim_takes_matching_map_once(tmp_path: Path) -> None:
+    engine = create_engine(f"sqlite:///{tmp_path / 'pool.db'}")
+    Base.metadata.create_all(bind=engine)
+    session_local = sessionmaker(bind=engine)
+    add_pool_map(session_local, size=32)
+    map_id = add_pool_map(session_local)
+
+    with session_local() as db:
+        assert claim_pregenerated_map(db, 64, 2, 0.0) == map_id
+        assert claim_pregenerated_map(db, 64, 2, 0.0) is None
+
+
+def test_concurrent_claims_never_share_a_map(tmp_path: Path) -> None:
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'pool.db'}", connect_args={"timeout": 30}
+    )
+    Base.metadata.create_all(bind=engine)
+    session_local = sessionmaker(bind=engine)
+    pool = {add_pool_map(session_local) for _ in range(5)}
+
+    claimed: list[str | None] = []
+
+    def claim() -> None:
+        with session_local() as db:
+            claimed.append(claim_pregenerated_map(db, 64, 2, 0.0))
+
+    threads = [threading.Thread(target=claim) for _ in range(12)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    claimed_ids = [map_id for map_id in claimed if map_id is not None]
+    assert sorted(claimed_ids) == sorted(pool)
+
+
+def test_pool_lookup_uses_partial_index(tmp_path: Path) -> None:
+    engine = create_engine(f"sqlite:///{tmp_path / 'pool.db'}")
+    Base.metadata.create_all(bind=engine)
+
+    with engine.connect() as conn:
+        plan = conn.execute(
+            text(
+                "EXPLAIN QUERY PLAN SELECT id FROM maps WHERE is_pregenerated IS 1 "
+                "AND size = 64 AND octaves = 2 AND island_density = 0.0 LIMIT 1"
+            )
+        ).all()
+
+    assert any("ix_maps_pool" in row[-1] for row in plan)
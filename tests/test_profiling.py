@@ -0,0 +1,91 @@
+import pstats
+import time
+from pathlib import Path
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from magrathea.main import app
+from magrathea.profiling import (
+    ProfileRing,
+    ProfilingMiddleware,
+    get_profile_ring,
+)
+
+
+def slow_app(ring: ProfileRing, budget: float) -> TestClient:
+    inner = FastAPI()
+
+    @inner.get("/slow")
+    def slow() -> dict[str, bool]:
+        time.sleep(0.05)
+        return {"ok": True}
+
+    return TestClient(ProfilingMiddleware(inner, 1.0, budget, ring))
+
+
+def test_slow_requests_are_profiled(tmp_path: Path) -> None:
+    ring = ProfileRing(tmp_path, keep=10)
+    client = slow_app(ring, budget=0.01)
+
+    assert client.get("/slow?seed=4").status_code == 200
+
+    (info,) = ring.list()
+    assert (info.path, info.query, info.status) == ("/slow", "seed=4", 200)
+    assert info.duration >= 0.05
+    path = ring.path(info.id)
+    assert path is not None
+    stats = pstats.Stats(str(path))
+    assert any(func[2] == "slow" for func in stats.stats)
+
+
+def test_fast_requests_are_discarded(tmp_path: Path) -> None:
+    ring = ProfileRing(tmp_path, keep=10)
+    client = slow_app(ring, budget=10.0)
+
+    client.get("/slow")
+
+    assert ring.list() == []
+
+
+def test_ring_keeps_newest(tmp_path: Path) -> None:
+    ring = ProfileRing(tmp_path, keep=2)
+    client = slow_app(ring, budget=0.0)
+
+    # All within one second, which must not scramble their order.
+    for n in range(4):
+        client.get(f"/slow?n={n}")
+
+    assert [info.query for info in ring.list()] == ["n=3", "n=2"]
+    assert len(list(tmp_path.glob("*.prof"))) == 2
+
+
+def test_admin_routes(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    ring = ProfileRing(tmp_path, keep=10)
+    slow_app(ring, budget=0.0).get("/slow")
+    app.dependency_overrides[get_profile_ring] = lambda: ring
+    monkeypatch.setattr("magrathea.profiling.ADMIN_TOKEN", "s3cret")
+    client = TestClient(app, headers={"Authorization": "Bearer s3cret"})
+    try:
+        (entry,) = client.get("/admin/profiles").json()
+        response = client.get(f"/admin/profiles/{entry['id']}")
+        assert response.status_code == 200
+        assert response.content == (tmp_path / f"{entry['id']}.prof").read_bytes()
+        assert client.get("/admin/profiles/..%2Fsecrets").status_code == 404
+
+        wrong = {"Authorization": "Bearer guess"}
+        assert client.get("/admin/profiles", headers=wrong).status_code == 401
+    finally:
+        app.dependency_overrides.clear()
+
+
+def test_admin_routes_are_disabled_without_token(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr("magrathea.profiling.ADMIN_TOKEN", None)
+    client = TestClient(app)
+
+    assert client.get("/admin/profiles").status_code == 403
+    headers = {"Authorization": "Bearer None"}
+    assert client.get("/admin/profiles", headers=headers).status_code == 403
@@ -0,0 +1,56 @@
+from pathlib import Path
+
+from magrathea.maps.render_cache import DiskCache, MemoryCache, RenderCache, cache_key
+
+
+def test_cache_key_is_stable_and_parameter_sensitive() -> None:
+    key = cache_key(64, 2, 42, 0.0)
+    assert key == cache_key(64, 2, 42, 0.0)
+    assert key != cache_key(64, 2, 43, 0.0)
+    assert key != cache_key(64, 2, 42, 0.5)
+
+
+def test_memory_cache_evicts_least_recently_used() -> None:
+    cache = MemoryCache(max_bytes=10)
+    cache.put("a", b"aaaa")
+    cache.put("b", b"bbbb")
+    assert cache.get("a") == b"aaaa"
+
+    cache.put("c", b"cccc")
+
+    assert cache.get("b") is None, "Least recently used entry should be evicted"
+    assert cache.get("a") == b"aaaa"
+    assert cache.get("c") == b"cccc"
+    assert cache.nbytes == 8
+
+
+def test_disk_cache_evicts_to_size_limit(tmp_path: Path) -> None:
+    cache = DiskCache(tmp_path, max_bytes=10)
+    for key in ("aa1", "aa2", "aa3"):
+        cache.put(key, b"xxxx")
+
+    stored = [p for p in tmp_path.glob("*/*") if p.is_file()]
+    assert sum(p.stat().st_size for p in stored) <= 10
+    assert cache.get("aa3") == b"xxxx"
+
+
+def test_render_cache_promotes_disk_hits(tmp_path: Path) -> None:
+    disk = DiskCache(tmp_path, max_bytes=1024)
+    disk.put("key", b"png")
+    cache = RenderCache(MemoryCache(max_bytes=1024), disk)
+
+    assert cache.get("key") == b"png"
+    assert cache.memory.get("key") == b"png"
+
+
+def test_get_or_render_renders_once(tmp_path: Path) -> None:
+    cache = RenderCache(MemoryCache(max_bytes=1024), DiskCache(tmp_path, 1024))
+    calls = []
+
+    def render() -> bytes:
+        calls.append(1)
+        return b"png"
+
+    assert cache.get_or_render("key", render) == b"png"
+    assert cache.get_or_render("key", render) == b"png"
+    assert len(calls) == 1
@@ -1,7 +1,20 @@
+import io
 import os
 from pathlib import Path
 
-from magrathea.maps.rendering_engine import render_map_to_buffer, render_map_to_png
+import numpy as np
+from PIL import Image
+
+from magrathea.maps.rendering_engine import (
+    colorize,
+    generate_heightmap,
+    iter_map_png,
+    max_zoom,
+    render_map_to_buffer,
+    render_map_to_png,
+    render_tile_png,
+    tile_heightmap,
+)
 
 
 def test_render_png(tmp_path: Path) -> None:
@@ -18,3 +31,39 @@ def test_render_buffer() -> None:
     buf = render_map_to_buffer(64, 2)
     assert buf.getbuffer().nbytes > 0, "Buffer should contain data"
     buf.close()
+
+
+def test_streamed_png_matches_heightmap() -> None:
+    size = 100
+    chunks = list(iter_map_png(size, 2, seed=5, band_rows=16))
+    assert len(chunks) > 2, "PNG should be produced in several chunks"
+
+    with Image.open(io.BytesIO(b"".join(chunks))) as img:
+        pixels = np.asarray(img.convert("RGB"))
+
+    expected = colorize(generate_heightmap(size, 2, seed=5))
+    assert np.array_equal(pixels, expected)
+
+
+def test_tiles_line_up_with_full_map() -> None:
+    size = 600
+    heightmap = generate_heightmap(size, 3, seed=5, island_density=0.1)
+    zoom = max_zoom(size)
+    assert zoom == 2
+
+    for x, y in [(0, 0), (1, 0), (2, 1), (1, 2)]:
+        tile = tile_heightmap(size, 3, 5, 0.1, zoom, x, y)
+        expected = heightmap[y * 256 : (y + 1) * 256, x * 256 : (x + 1) * 256]
+        rows, cols = expected.shape
+        assert np.array_equal(tile[:rows, :cols], expected)
+        # Beyond the edge of the map is open sea.
+        assert not tile[rows:].any() and not tile[:, cols:].any()
+
+    # Zoom 0 samples every fourth pixel of this map.
+    overview = tile_heightmap(size, 3, 5, 0.1, 0, 0, 0)
+    assert np.array_equal(overview[:150, :150], heightmap[::4, ::4])
+
+
+def test_render_tile_png() -> None:
+    with Image.open(io.BytesIO(render_tile_png(512, 2, 7, 0.0, 1, 1, 0))) as img:
+        assert img.size == (256, 256)
@@ -0,0 +1,141 @@
+import time
+from collections.abc import Generator
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from magrathea.database import Base
+from magrathea.maps.blob_store import LocalBlobStore
+from magrathea.maps.pool import claim_pregenerated_map
+from magrathea.maps.replenisher import (
+    POOL_LEASE_KEY,
+    PoolBucket,
+    PoolReplenisher,
+    generate_pool_maps,
+    parse_buckets,
+    pool_level,
+)
+from magrathea.redis_store import InMemoryStore
+
+
+@pytest.fixture
+def session_local(tmp_path: Path) -> sessionmaker[Session]:
+    engine = create_engine(f"sqlite:///{tmp_path / 'pool.db'}")
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(bind=engine)
+
+
+@pytest.fixture
+def executor() -> Generator[ThreadPoolExecutor]:
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        yield executor
+
+
+def test_parse_buckets() -> None:
+    assert parse_buckets("128:4:0.0:10, 256:2:0.5:3") == [
+        PoolBucket(128, 4, 0.0, 10),
+        PoolBucket(256, 2, 0.5, 3),
+    ]
+
+
+def test_run_once_refills_to_target(
+    session_local: sessionmaker[Session], executor: ThreadPoolExecutor, tmp_path: Path
+) -> None:
+    bucket = PoolBucket(size=32, octaves=2, island_density=0.0, target=3)
+    replenisher = PoolReplenisher(
+        [bucket],
+        session_factory=session_local,
+        blobs=LocalBlobStore(tmp_path / "blobs"),
+        executor=executor,
+        batch_size=2,
+    )
+
+    assert replenisher.run_once() == 3
+    assert replenisher.run_once() == 0
+
+    with session_local() as db:
+        assert pool_level(db, bucket) == 3
+        assert claim_pregenerated_map(db, 32, 2, 0.0) is not None
+        assert pool_level(db, bucket) == 2
+
+    assert replenisher.run_once() == 1
+
+
+def test_only_the_lease_holder_refills(
+    session_local: sessionmaker[Session], executor: ThreadPoolExecutor, tmp_path: Path
+) -> None:
+    bucket = PoolBucket(size=32, octaves=2, island_density=0.0, target=3)
+    shared = InMemoryStore()
+    first, second = (
+        PoolReplenisher(
+            [bucket],
+            session_factory=session_local,
+            blobs=LocalBlobStore(tmp_path / "blobs"),
+            executor=executor,
+            interval=0.01,
+            store=shared,
+        )
+        for _ in range(2)
+    )
+
+    assert first.hold_lease()
+    assert not second.hold_lease()
+    # Web workers each running a replenisher must not over-fill the bucket.
+    first.start()
+    second.start()
+    deadline = time.monotonic() + 10
+    with session_local() as db:
+        while pool_level(db, bucket) < bucket.target and time.monotonic() < deadline:
+            time.sleep(0.05)
+    time.sleep(0.1)
+    first.stop()
+    assert second.hold_lease()
+    second.stop()
+
+    with session_local() as db:
+        assert pool_level(db, bucket) == bucket.target
+
+
+def test_lease_is_never_taken_over_by_its_former_holder(
+    session_local: sessionmaker[Session], executor: ThreadPoolExecutor, tmp_path: Path
+) -> None:
+    bucket = PoolBucket(size=32, octaves=2, island_density=0.0, target=3)
+    shared = InMemoryStore()
+    replenisher = PoolReplenisher(
+        [bucket],
+        session_factory=session_local,
+        blobs=LocalBlobStore(tmp_path / "blobs"),
+        executor=executor,
+        store=shared,
+    )
+    assert replenisher.hold_lease()
+
+    # The lease lapsed and another replenisher took it.
+    shared.set(POOL_LEASE_KEY, "other", ex=60)
+    assert not replenisher.hold_lease()
+    assert replenisher.run_once() == 0
+    replenisher.release_lease()
+    assert shared.get(POOL_LEASE_KEY) == b"other"
+
+
+def test_refill_stops_when_it_may_not_proceed(
+    session_local: sessionmaker[Session], executor: ThreadPoolExecutor, tmp_path: Path
+) -> None:
+    bucket = PoolBucket(size=32, octaves=2, island_density=0.0, target=3)
+    checks = iter([True, False])
+
+    with session_local() as db:
+        added = generate_pool_maps(
+            db,
+            LocalBlobStore(tmp_path / "blobs"),
+            executor,
+            bucket,
+            3,
+            batch_size=1,
+            proceed=lambda: next(checks),
+        )
+        assert added == 1
+        assert pool_level(db, bucket) == 1
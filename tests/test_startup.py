@@ -0,0 +1,61 @@
+import json
+import subprocess
+import sys
+
+import pytest
+
+# Generous for slow CI machines; an import of Numba or the GIS stack alone
+# would not fit alongside FastAPI and SQLAlchemy.
+IMPORT_BUDGET_SECONDS = 2.0
+HEAVY_MODULES = (
+    "numba",
+    "llvmlite",
+    "PIL",
+    "scipy",
+    "matplotlib",
+    "cartopy",
+    "geopandas",
+    "shapely",
+    "PyQt6",
+)
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+print(json.dumps({{"seconds": seconds, "modules": sorted(sys.modules)}}))
+"""
+
+
+def import_in_fresh_process(module: str) -> tuple[float, set[str]]:
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE.format(module=module)],
+        capture_output=True,
+        check=True,
+        text=True,
+    ).stdout
+    result = json.loads(output.splitlines()[-1])
+    return result["seconds"], {name.split(".")[0] for name in result["modules"]}
+
+
+@pytest.mark.parametrize(
+    "module", ["magrathea.main", "magrathea.maps.seed_maps", "magrathea.maps.job_queue"]
+)
+def test_import_skips_heavy_modules(module: str) -> None:
+    seconds, loaded = import_in_fresh_process(module)
+
+    assert loaded.isdisjoint(HEAVY_MODULES), loaded & set(HEAVY_MODULES)
+    assert seconds < IMPORT_BUDGET_SECONDS
+
+
+def test_kernels_are_loaded_before_requests(monkeypatch: pytest.MonkeyPatch) -> None:
+    from fastapi.testclient import TestClient
+
+    from magrathea import main
+
+    calls = []
+    monkeypatch.setattr(main, "warm_up", lambda: calls.append("warm_up"))
+
+    with TestClient(main.app):
+        assert calls == ["warm_up"]
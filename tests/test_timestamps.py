@@ -20,7 +20,14 @@ def test_timestamps() -> None:
     try:
         # Create a new map
         map_id = "test_timestamp_map"
-        new_map = Map(id=map_id, size=100, octaves=4, data=b"fake data")
+        new_map = Map(
+            id=map_id,
+            size=100,
+            octaves=4,
+            blob_key="fake_key",
+            byte_size=9,
+            content_hash="fake_hash",
+        )
         db.add(new_map)
         db.commit()
         db.refresh(new_map)
@@ -0,0 +1,74 @@
+import weakref
+
+import numpy as np
+
+from magrathea.maps.layers import LayerCache
+from magrathea.maps.rendering_engine import generate_heightmap
+from magrathea.maps.world_map import (
+    BIOME_NAMES,
+    BIOMES,
+    DEFAULT_LEVELS,
+    FIELD_SCALE,
+    WorldMap,
+    biome_lookup,
+    dequantize,
+)
+
+
+def test_biome_map_matches_per_point_lookup() -> None:
+    world = WorldMap(size=64, seed_height=1, seed_heat=2, seed_wet=3)
+
+    biomes = world.biome_map()
+
+    assert biomes.shape == (64, 64)
+    assert biomes.dtype == np.uint8
+    for x, y in [(0, 0), (32, 32), (20, 45), (63, 10)]:
+        assert BIOME_NAMES[biomes[y, x]] == world.get_biome_from_point(x, y)
+    # The map edge is always ocean and its centre usually isn't.
+    assert BIOME_NAMES[biomes[0, 0]] == "Ocean"
+    assert len(np.unique(biomes)) > 1
+
+
+def test_heightmap_field_matches_rendered_heightmap() -> None:
+    world = WorldMap(size=64, seed_height=9)
+
+    height, _, _ = world.fields()
+
+    assert height.dtype == np.uint16
+    expected = generate_heightmap(64, 4, seed=9)
+    assert np.abs(dequantize(height) - expected).max() <= 1 / FIELD_SCALE
+
+
+def test_fields_are_lazy_and_recomputable() -> None:
+    cache = LayerCache(max_bytes=1024 * 1024)
+    world = WorldMap(size=64, seed_height=1, seed_heat=2, seed_wet=3, cache=cache)
+    assert world.nbytes == 0
+
+    values = weakref.ref(world.heat_map.values)
+    heat = world.heat_map.values.copy()
+    assert world.nbytes == 64 * 64 * 2
+
+    world.drop()
+    assert world.nbytes == 0
+    # Nothing else holds the dropped field, the layer cache included.
+    assert cache.nbytes == 0
+    assert values() is None
+    assert np.array_equal(world.heat_map.values, heat)
+
+
+def test_biome_lookup_packs_table() -> None:
+    levels = {"height": [0.5], "heat": [0.5], "wet": [0.5]}
+    lookup = biome_lookup({(1, 1, 1): "Rainforest", (1, 0, 1): "Taiga"}, levels)
+
+    assert lookup.shape == (2, 2, 2)
+    assert BIOME_NAMES[lookup[1, 1, 1]] == "Rainforest"
+    assert BIOME_NAMES[lookup[1, 0, 1]] == "Taiga"
+    # Combinations the table leaves out fall back to the first biome.
+    assert BIOME_NAMES[lookup[0, 1, 0]] == BIOME_NAMES[0]
+
+
+def test_default_table_covers_default_levels() -> None:
+    lookup = biome_lookup(BIOMES, DEFAULT_LEVELS)
+
+    assert lookup.shape == (4, 3, 3)
+    assert len(BIOMES) == lookup.size